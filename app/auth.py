@@ -1,9 +1,13 @@
+import logging
 import os
+import threading
+import time
 import unittest
 from unittest.mock import patch
 from flask_httpauth import HTTPTokenAuth
 import jwt
 
+from app.cache import NOT_FOUND, TTLCache, hash_key
 from app.config import VERIFY_JWT_SIGNATURE
 
 auth = HTTPTokenAuth(scheme="Bearer")
@@ -17,6 +21,14 @@ OIDC_CLIENT_ID_EHERKENNING = os.getenv("OIDC_CLIENT_ID_EHERKENNING", "eherkennin
 OIDC_CLIENT_ID_YIVI = os.getenv("OIDC_CLIENT_ID_YIVI", "yivi")
 OIDC_JWKS_URL = os.getenv("OIDC_JWKS_URL", "")
 
+# The signing keys are refreshed after the ttl, or earlier when a token has an unknown kid
+OIDC_JWKS_TTL = int(os.getenv("OIDC_JWKS_TTL", 60 * 60))
+OIDC_JWKS_REFRESH_COOLDOWN = int(os.getenv("OIDC_JWKS_REFRESH_COOLDOWN", 60))
+
+# Profiles of verified tokens, entries expire at the exp of the token or after the ttl
+VERIFIED_TOKEN_CACHE_TTL = int(os.getenv("VERIFIED_TOKEN_CACHE_TTL", 15 * 60))
+VERIFIED_TOKEN_CACHE_MAXSIZE = int(os.getenv("VERIFIED_TOKEN_CACHE_MAXSIZE", 10000))
+
 TOKEN_ID_ATTRIBUTE_EHERKENNING = "urn:etoegang:1.9:EntityConcernedID:KvKnr"
 
 # Op 1.13 met ketenmachtiging
@@ -100,9 +112,93 @@ def get_profile_id(token_data):
     return token_data[id_attribute]
 
 
+class JWKSKeyStore:
+    """Process wide store of the signing keys of the OIDC provider.
+
+    The keys are fetched again after ttl seconds. A kid that is not in the store forces a refresh,
+    at most once per refresh_cooldown seconds. Only one thread fetches the keys at a time, the
+    other threads use the keys it fetched.
+    """
+
+    def __init__(self, jwks_url: str, ttl: int, refresh_cooldown: int):
+        self.jwks_client = jwt.PyJWKClient(jwks_url, cache_jwk_set=False)
+        self.ttl = ttl
+        self.refresh_cooldown = refresh_cooldown
+
+        self._keys = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def fetch_keys(self):
+        jwk_set = self.jwks_client.get_jwk_set(refresh=True)
+
+        return {
+            jwk.key_id: jwk
+            for jwk in jwk_set.keys
+            if jwk.public_key_use in ["sig", None] and jwk.key_id
+        }
+
+    def is_expired(self):
+        return (
+            self._fetched_at is None or time.monotonic() - self._fetched_at >= self.ttl
+        )
+
+    def refresh(self, force=False):
+        fetched_at = self._fetched_at
+
+        with self._lock:
+            # The keys were refreshed by another thread while waiting for the lock
+            if self._fetched_at != fetched_at:
+                return
+
+            now = time.monotonic()
+
+            if (
+                force
+                and self._fetched_at is not None
+                and now - self._fetched_at < self.refresh_cooldown
+            ):
+                return
+
+            try:
+                self._keys = self.fetch_keys()
+            except jwt.PyJWTError:
+                if not self._keys:
+                    raise
+                # Keep using the current keys, try again after the cooldown
+                logging.exception("Could not refresh the JWKS signing keys")
+                self._fetched_at = now - self.ttl + self.refresh_cooldown
+                return
+
+            self._fetched_at = now
+
+    def get_signing_key(self, kid):
+        if self.is_expired():
+            self.refresh()
+
+        signing_key = self._keys.get(kid)
+
+        if signing_key is None:
+            self.refresh(force=True)
+            signing_key = self._keys.get(kid)
+
+        if signing_key is None:
+            raise jwt.PyJWKClientError(
+                f'Unable to find a signing key that matches: "{kid}"'
+            )
+
+        return signing_key
+
+    def get_signing_key_from_jwt(self, token):
+        header = jwt.get_unverified_header(token)
+        return self.get_signing_key(header.get("kid"))
+
+
+jwks_key_store = JWKSKeyStore(OIDC_JWKS_URL, OIDC_JWKS_TTL, OIDC_JWKS_REFRESH_COOLDOWN)
+
+
 def get_verified_token_data(token):
-    jwks_client = jwt.PyJWKClient(OIDC_JWKS_URL)
-    signing_key = jwks_client.get_signing_key_from_jwt(token)
+    signing_key = jwks_key_store.get_signing_key_from_jwt(token)
 
     audience = [
         get_client_id(PROFILE_TYPE_PRIVATE),
@@ -121,18 +217,44 @@ def get_verified_token_data(token):
     return token_data
 
 
-def get_user_profile_from_token(token):
-    if VERIFY_JWT_SIGNATURE:
-        token_data = get_verified_token_data(token)
-    else:
-        token_data = jwt.api_jwt.decode(token, options={"verify_signature": False})
+verified_token_cache = TTLCache(VERIFIED_TOKEN_CACHE_MAXSIZE, VERIFIED_TOKEN_CACHE_TTL)
+
 
+def get_profile(token_data):
     profile_type = get_profile_type(token_data)
     profile_id = get_profile_id(token_data)
 
     return {"id": profile_id, "type": profile_type}
 
 
+def get_verified_user_profile(token):
+    """Returns the profile of a verified token, repeated tokens are not verified again until they
+    expire."""
+    cache_key = hash_key(token)
+    profile = verified_token_cache.get(cache_key)
+
+    if profile is NOT_FOUND:
+        token_data = get_verified_token_data(token)
+        profile = get_profile(token_data)
+
+        ttl = VERIFIED_TOKEN_CACHE_TTL
+        if "exp" in token_data:
+            ttl = min(ttl, token_data["exp"] - time.time())
+
+        verified_token_cache.set(cache_key, profile, ttl=ttl)
+
+    return dict(profile)
+
+
+def get_user_profile_from_token(token):
+    if VERIFY_JWT_SIGNATURE:
+        return get_verified_user_profile(token)
+
+    token_data = jwt.api_jwt.decode(token, options={"verify_signature": False})
+
+    return get_profile(token_data)
+
+
 @auth.verify_token
 def verify_token(token):
     if not token:
@@ -0,0 +1,306 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import struct
+import tempfile
+import threading
+import time
+from functools import lru_cache
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from app.config import (
+    DECOS_BLOB_CACHE_DIR,
+    DECOS_BLOB_CACHE_MAX_BYTES,
+    DECOS_BLOB_CACHE_MAX_ITEM_BYTES,
+    get_encrytion_key,
+)
+
+MAGIC = b"DJBC1"
+
+# Temp files of writes that did not finish, e.g. because the process was killed
+STALE_TEMP_FILE_SECONDS = 60 * 60
+
+# Every record starts with a flag marking the last record and the length of the record
+_RECORD_HEADER = struct.Struct(">?I")
+_RECORD_COUNTER = struct.Struct(">I")
+_NONCE_PREFIX_SIZE = 8
+
+
+class CorruptBlobError(Exception):
+    pass
+
+
+@lru_cache(maxsize=4)
+def derive_keys(fernet_key: str):
+    """Returns the key to encrypt the cached blobs with and the key to derive file names with,
+    both derived from the Fernet key so cached blobs are unreadable without it."""
+    key_material = HKDF(
+        algorithm=hashes.SHA256(),
+        length=64,
+        salt=None,
+        info=b"decosjoin-blob-cache",
+    ).derive(base64.urlsafe_b64decode(fernet_key))
+
+    return AESGCM(key_material[:32]), key_material[32:]
+
+
+class BlobCache:
+    """Content cache of document blobs on the local disk, shared by the processes on a host.
+
+    Blobs are keyed by a keyed hash of the document id and encrypted in chunks with AES-GCM, each
+    chunk is authenticated before it is served. Files are written to a temp file and moved into
+    place with os.replace so readers never see partial files. The least recently used files
+    (by mtime) are evicted when the directory exceeds max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_item_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_item_bytes = min(max_item_bytes, max_bytes)
+
+        self._evict_lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def get_keys(self):
+        return derive_keys(get_encrytion_key())
+
+    def get_name(self, document_id: str, name_key: bytes):
+        return hmac.new(name_key, document_id.encode(), hashlib.sha256).hexdigest()
+
+    def get(self, document_id: str):
+        """Returns the cached headers with file_data as an iterator of the decrypted chunks, or
+        None when the document is not cached."""
+        cipher, name_key = self.get_keys()
+        name = self.get_name(document_id, name_key)
+        path = os.path.join(self.directory, name)
+
+        try:
+            blob_file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+        records = self.iter_records(blob_file, cipher, name.encode())
+
+        try:
+            document = json.loads(next(records))
+        except (CorruptBlobError, StopIteration, ValueError):
+            records.close()
+            self.remove(path)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        document["file_data"] = self.iter_content(records, path)
+        return document
+
+    def iter_content(self, records, path):
+        try:
+            yield from records
+        except CorruptBlobError:
+            logging.error("Removed corrupt document from the blob cache")
+            self.remove(path)
+            raise
+        finally:
+            records.close()
+
+    @staticmethod
+    def iter_records(blob_file, cipher, name):
+        with blob_file:
+            if blob_file.read(len(MAGIC)) != MAGIC:
+                raise CorruptBlobError()
+
+            nonce_prefix = blob_file.read(_NONCE_PREFIX_SIZE)
+            counter = 0
+            is_last = False
+
+            while not is_last:
+                header = blob_file.read(_RECORD_HEADER.size)
+
+                if len(header) != _RECORD_HEADER.size:
+                    raise CorruptBlobError()
+
+                [is_last, length] = _RECORD_HEADER.unpack(header)
+                nonce = nonce_prefix + _RECORD_COUNTER.pack(counter)
+
+                try:
+                    record = cipher.decrypt(
+                        nonce, blob_file.read(length), name + bytes([is_last])
+                    )
+                except InvalidTag:
+                    raise CorruptBlobError()
+
+                counter += 1
+                yield record
+
+    def writer(self, document_id: str, document: dict):
+        return BlobCacheWriter(self, document_id, document)
+
+    def tee(self, document_id: str, document: dict, chunks):
+        """Yields the chunks and caches them when all of them have been consumed."""
+        writer = self.writer(document_id, document)
+
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+                yield chunk
+
+            writer.commit()
+        finally:
+            # Nothing is cached when the client went away before the stream was consumed
+            writer.abort()
+
+    def put(self, document_id: str, document: dict, content: bytes):
+        writer = self.writer(document_id, document)
+        writer.write(content)
+        writer.commit()
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        now = time.time()
+        files = []
+        total_size = 0
+
+        with self._evict_lock:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+
+                    if entry.name.endswith(".tmp"):
+                        if stat.st_mtime < now - STALE_TEMP_FILE_SECONDS:
+                            self.remove(entry.path)
+                        continue
+
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_size += stat.st_size
+
+            files.sort()
+
+            for _, size, path in files:
+                if total_size <= self.max_bytes:
+                    break
+
+                self.remove(path)
+                total_size -= size
+
+
+class BlobCacheWriter:
+    """Encrypts a blob into a temp file, commit moves the file into the cache. Blobs larger than
+    max_item_bytes of the cache are not cached."""
+
+    def __init__(self, blob_cache: BlobCache, document_id: str, document: dict):
+        self.blob_cache = blob_cache
+
+        self.cipher, name_key = blob_cache.get_keys()
+        self.name = blob_cache.get_name(document_id, name_key)
+        self.nonce_prefix = secrets.token_bytes(_NONCE_PREFIX_SIZE)
+        self.counter = 0
+        self.size = 0
+        self.content_length = document.get("Content-Length")
+
+        self.temp_path = None
+        self.file = None
+
+        if self.content_length and int(self.content_length) > blob_cache.max_item_bytes:
+            return
+
+        fd, self.temp_path = tempfile.mkstemp(dir=blob_cache.directory, suffix=".tmp")
+        self.file = os.fdopen(fd, "wb")
+        self.file.write(MAGIC + self.nonce_prefix)
+
+        # The headers are the first record. A record is written when the next one arrives so
+        # the last record can be flagged as such on commit.
+        self.pending = json.dumps(document).encode()
+
+    def write_record(self, record: bytes, is_last: bool):
+        nonce = self.nonce_prefix + _RECORD_COUNTER.pack(self.counter)
+        encrypted = self.cipher.encrypt(
+            nonce, record, self.name.encode() + bytes([is_last])
+        )
+
+        self.file.write(_RECORD_HEADER.pack(is_last, len(encrypted)) + encrypted)
+        self.counter += 1
+
+    def write(self, chunk: bytes):
+        if self.file is None:
+            return
+
+        self.size += len(chunk)
+
+        if self.size > self.blob_cache.max_item_bytes:
+            self.abort()
+            return
+
+        self.write_record(self.pending, is_last=False)
+        self.pending = chunk
+
+    def commit(self):
+        if self.file is None:
+            return
+
+        if self.content_length and int(self.content_length) != self.size:
+            self.abort()
+            return
+
+        try:
+            self.write_record(self.pending, is_last=True)
+            self.file.close()
+            self.file = None
+            os.replace(
+                self.temp_path, os.path.join(self.blob_cache.directory, self.name)
+            )
+        except OSError:
+            logging.exception("Could not add document to the blob cache")
+            self.abort()
+            return
+
+        self.blob_cache.evict()
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.blob_cache.remove(self.temp_path)
+
+
+_blob_cache = None
+_blob_cache_lock = threading.Lock()
+
+
+def get_blob_cache():
+    """Returns the blob cache, or None when no DECOS_BLOB_CACHE_DIR is configured."""
+    global _blob_cache
+
+    if not DECOS_BLOB_CACHE_DIR:
+        return None
+
+    if _blob_cache is None:
+        with _blob_cache_lock:
+            if _blob_cache is None:
+                _blob_cache = BlobCache(
+                    DECOS_BLOB_CACHE_DIR,
+                    DECOS_BLOB_CACHE_MAX_BYTES,
+                    DECOS_BLOB_CACHE_MAX_ITEM_BYTES,
+                )
+
+    return _blob_cache
@@ -0,0 +1,75 @@
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by TTLCache.get when a key is not cached, None can be a cached value.
+NOT_FOUND = object()
+
+# Per process secret used for hashing cache keys, raw identifiers (BSN/KvK) are not kept in memory.
+_KEY_SECRET = secrets.token_bytes(32)
+
+
+def hash_key(*parts) -> bytes:
+    """Returns a keyed hash of the given parts to be used as cache key."""
+    message = "\x1f".join(str(part) for part in parts).encode()
+    return hmac.new(_KEY_SECRET, message, hashlib.sha256).digest()
+
+
+class TTLCache:
+    """Thread safe, size bounded LRU cache of which the entries expire after a time-to-live.
+    A maxsize or ttl of 0 disables the cache."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=NOT_FOUND):
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+
+            if expires_at <= now:
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """Adds value to the cache, ttl overrides the default time-to-live of the cache."""
+        if ttl is None:
+            ttl = self.ttl
+
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+
+        expires_at = time.monotonic() + ttl
+
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
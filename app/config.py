@@ -5,6 +5,8 @@ from datetime import date, time
 
 from flask.json.provider import DefaultJSONProvider
 
+from app.zaak_record import ZaakRecord
+
 BASE_PATH = os.path.abspath(os.path.dirname(__file__))
 
 OTAP_ENV = os.getenv("MA_OTAP_ENV")
@@ -25,6 +27,63 @@ VERIFY_JWT_SIGNATURE = os.getenv("VERIFY_JWT_SIGNATURE", IS_AP)
 
 DECOS_API_REQUEST_TIMEOUT = 5
 
+# Worker threads shared by all requests for work on the Decos api, per process
+DECOS_API_MAX_WORKERS = int(os.getenv("DECOS_API_MAX_WORKERS", 12))
+
+# Max number of requests to the Decos api in flight at the same time, per process
+DECOS_API_MAX_IN_FLIGHT = int(os.getenv("DECOS_API_MAX_IN_FLIGHT", 12))
+
+# Streamed document bodies are read outside of the in flight slots, the connection pool has
+# room for this many of them next to the requests in flight
+DECOS_API_POOL_STREAMS = int(os.getenv("DECOS_API_POOL_STREAMS", 8))
+
+# Max number of pooled (keep-alive) connections to the Decos api host, per process. The pool
+# does not block, connections above this number are closed instead of reused.
+DECOS_API_POOL_MAXSIZE = int(
+    os.getenv(
+        "DECOS_API_POOL_MAXSIZE", DECOS_API_MAX_IN_FLIGHT + DECOS_API_POOL_STREAMS
+    )
+)
+
+# Max number of pages of a single listing fetched in parallel
+DECOS_API_PAGE_WORKERS = int(os.getenv("DECOS_API_PAGE_WORKERS", 4))
+
+# Size of the chunks in which document blobs are streamed to the client
+DECOS_API_BLOB_CHUNK_SIZE = int(os.getenv("DECOS_API_BLOB_CHUNK_SIZE", 64 * 1024))
+
+# Optional encrypted disk cache of document blobs shared by the processes on a host, the
+# cache is enabled by setting the directory
+DECOS_BLOB_CACHE_DIR = os.getenv("DECOS_BLOB_CACHE_DIR", None)
+DECOS_BLOB_CACHE_MAX_BYTES = int(os.getenv("DECOS_BLOB_CACHE_MAX_BYTES", 1024**3))
+DECOS_BLOB_CACHE_MAX_ITEM_BYTES = int(
+    os.getenv("DECOS_BLOB_CACHE_MAX_ITEM_BYTES", 50 * 1024**2)
+)
+
+# Serve the /decosjoin routes with the asyncio client, see decosjoin_service_async. Only
+# enabled with DECOS_ASYNC_ENABLED=true
+DECOS_ASYNC_ENABLED = os.getenv("DECOS_ASYNC_ENABLED", "false").lower() == "true"
+
+# Max number of requests of the asyncio client in flight at the same time, per process
+DECOS_API_ASYNC_MAX_IN_FLIGHT = int(os.getenv("DECOS_API_ASYNC_MAX_IN_FLIGHT", 100))
+
+# Cache of decrypted tokens, entries expire with the token
+DECRYPT_CACHE_MAXSIZE = int(os.getenv("DECRYPT_CACHE_MAXSIZE", 10000))
+
+# Cache of the Decos keys belonging to a BSN/KvK, a ttl of 0 disables the cache
+DECOS_USER_KEYS_CACHE_TTL = int(os.getenv("DECOS_USER_KEYS_CACHE_TTL", 60 * 60))
+DECOS_USER_KEYS_CACHE_MAXSIZE = int(os.getenv("DECOS_USER_KEYS_CACHE_MAXSIZE", 10000))
+
+# Cache of the dates of workflow steps, steps without a date yet are cached shorter
+DECOS_WORKFLOW_DATE_CACHE_TTL = int(
+    os.getenv("DECOS_WORKFLOW_DATE_CACHE_TTL", 24 * 60 * 60)
+)
+DECOS_WORKFLOW_DATE_CACHE_MISS_TTL = int(
+    os.getenv("DECOS_WORKFLOW_DATE_CACHE_MISS_TTL", 5 * 60)
+)
+DECOS_WORKFLOW_DATE_CACHE_MAXSIZE = int(
+    os.getenv("DECOS_WORKFLOW_DATE_CACHE_MAXSIZE", 50000)
+)
+
 # Set-up logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "ERROR").upper()
 
@@ -37,6 +96,9 @@ logging.basicConfig(
 
 class UpdatedJSONProvider(DefaultJSONProvider):
     def default(self, obj):
+        if isinstance(obj, ZaakRecord):
+            return obj.to_dict()
+
         if isinstance(obj, time):
             return obj.isoformat(timespec="minutes")
 
@@ -70,5 +132,16 @@ def get_decosjoin_adres_boeken_kvk():
     return os.getenv("DECOS_JOIN_ADRES_BOEKEN_KVK").split(",")
 
 
+def get_requests_ca_bundle():
+    """The CA bundle of the requests library (with the extra certificates of ca/), see Dockerfile"""
+    return os.getenv("REQUESTS_CA_BUNDLE")
+
+
 def get_encrytion_key():
     return os.getenv("FERNET_ENCRYPTION_KEY")
+
+
+def get_encrytion_keys_secondary():
+    """Retired keys of which the tokens are still accepted, e.g. during a key rotation."""
+    keys = os.getenv("FERNET_ENCRYPTION_KEYS_SECONDARY", "")
+    return [key.strip() for key in keys.split(",") if key.strip()]
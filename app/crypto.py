@@ -1,19 +1,85 @@
-from typing import Optional
+import base64
+import struct
+import time
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
 
-from cryptography.fernet import Fernet, InvalidToken
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 
-from app.config import get_encrytion_key
+from app.cache import NOT_FOUND, TTLCache, hash_key
+from app.config import (
+    DECRYPT_CACHE_MAXSIZE,
+    get_encrytion_key,
+    get_encrytion_keys_secondary,
+)
+
+TOKEN_TTL = 60 * 60
+
+# Decrypted (bsn, value) per token, the ttl of an entry is set to the remaining ttl of the token
+decrypt_cache = TTLCache(DECRYPT_CACHE_MAXSIZE, TOKEN_TTL)
+
+
+@lru_cache(maxsize=4)
+def get_fernet(key: str) -> Fernet:
+    """Returns the Fernet instance for key, it is built once per key."""
+    return Fernet(key)
+
+
+@lru_cache(maxsize=4)
+def get_multi_fernet(keys: Tuple[str, ...]) -> MultiFernet:
+    """Returns the MultiFernet for the primary key followed by the secondary keys. Tokens of the
+    primary key are verified by the first Fernet, secondary keys are only tried for old tokens.
+    """
+    return MultiFernet([get_fernet(key) for key in keys])
+
+
+def get_decryption_keys() -> Tuple[str, ...]:
+    return (get_encrytion_key(), *get_encrytion_keys_secondary())
 
 
 def encrypt(plain_text: str, bsn: Optional[str] = "") -> str:
-    f = Fernet(get_encrytion_key())
+    f = get_fernet(get_encrytion_key())
     return f.encrypt(f"{bsn}:{plain_text}".encode()).decode()
 
 
+def encrypt_many(items: Iterable[Tuple[str, Optional[str]]]) -> List[str]:
+    """Encrypts (plain_text, bsn) pairs, like encrypt, with a single key lookup and timestamp."""
+    f = get_fernet(get_encrytion_key())
+    current_time = int(time.time())
+
+    return [
+        f.encrypt_at_time(f"{bsn}:{plain_text}".encode(), current_time).decode()
+        for plain_text, bsn in items
+    ]
+
+
+def get_token_timestamp(encrypted: str) -> int:
+    """Returns the timestamp of a verified Fernet token."""
+    [timestamp] = struct.unpack(">Q", base64.urlsafe_b64decode(encrypted)[1:9])
+    return timestamp
+
+
+def decrypt_bsn_value(encrypted: str) -> Tuple[str, str]:
+    keys = get_decryption_keys()
+    cache_key = hash_key(encrypted, *keys)
+    bsn_value = decrypt_cache.get(cache_key)
+
+    if bsn_value is NOT_FOUND:
+        f = get_multi_fernet(keys)
+        value_bsn = f.decrypt(encrypted.encode(), ttl=TOKEN_TTL).decode()
+        bsn_value = tuple(value_bsn.split(":", maxsplit=1))
+
+        decrypt_cache.set(
+            cache_key,
+            bsn_value,
+            ttl=get_token_timestamp(encrypted) + TOKEN_TTL - time.time(),
+        )
+
+    return bsn_value
+
+
 def decrypt(encrypted: str, match_bsn: Optional[str] = None) -> str:
-    f = Fernet(get_encrytion_key())
-    value_bsn = f.decrypt(encrypted.encode(), ttl=60 * 60).decode()
-    bsn, value = value_bsn.split(":", maxsplit=1)
+    bsn, value = decrypt_bsn_value(encrypted)
 
     if match_bsn:
         if bsn != match_bsn:
@@ -1,88 +1,118 @@
-import concurrent.futures
+import hashlib
 import logging
 import math
+import os
+import threading
+from collections import deque
+from itertools import islice
 
 import requests
 from requests import PreparedRequest
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
 from app.auth import PROFILE_TYPE_COMMERCIAL, PROFILE_TYPE_PRIVATE
+from app.blob_cache import get_blob_cache
+from app.cache import NOT_FOUND, TTLCache, hash_key
 from app.config import (
+    DECOS_API_BLOB_CHUNK_SIZE,
+    DECOS_API_PAGE_WORKERS,
+    DECOS_API_POOL_MAXSIZE,
     DECOS_API_REQUEST_TIMEOUT,
+    DECOS_USER_KEYS_CACHE_MAXSIZE,
+    DECOS_USER_KEYS_CACHE_TTL,
+    DECOS_WORKFLOW_DATE_CACHE_MAXSIZE,
+    DECOS_WORKFLOW_DATE_CACHE_MISS_TTL,
+    DECOS_WORKFLOW_DATE_CACHE_TTL,
     get_decosjoin_adres_boeken_bsn,
     get_decosjoin_adres_boeken_kvk,
 )
-from app.crypto import encrypt
+from app.crypto import encrypt_many
 from app.field_parsers import (
-    get_fields,
+    compile_parse_fields,
+    get_compiled_fields,
     to_date,
     to_int,
     to_string,
     to_string_or_empty_string,
 )
-from app.zaaktypes import zaken_index
+from app.scheduler import scheduler
+from app.zaaktypes import get_select_fields, zaken_index
 
 PAGE_SIZE = 60
 
-SELECT_FIELDS = ",".join(
-    [
-        "title",
-        "mark",
-        "text45",
-        "subject1",
-        "bol7",
-        "bol8",
-        "bol9",
-        "bol10",
-        "bol11",
-        "bol12",
-        "bol13",
-        "bol16",
-        "bol17",
-        "bol18",
-        "bol20",
-        "bol21",
-        "bol22",
-        "bol23",
-        "bol52",
-        "company",
-        "date1",
-        "date2",
-        "date5",
-        "date6",
-        "date7",
-        "date8",
-        "dfunction",
-        "document_date",
-        "num3",
-        "num6",
-        "num14",
-        "num15",
-        "text5",
-        "text6",
-        "text7",
-        "text8",
-        "text9",
-        "text10",
-        "text11",
-        "text12",
-        "text13",
-        "text14",
-        "text15",
-        "text17",
-        "text18",
-        "text19",
-        "text20",
-        "text21",
-        "text22",
-        "text25",
-        "text39",
-        "text49",
-        "processed",
-        "sequence",
-    ]
+DOCUMENT_PARSE_FIELDS = [
+    {"name": "title", "from": "text41", "parser": to_string_or_empty_string},
+    {"name": "id", "from": "mark", "parser": to_string},
+    {"name": "sequence", "from": "sequence", "parser": to_int},
+    {"name": "text39", "from": "text39", "parser": to_string_or_empty_string},
+    {"name": "text40", "from": "text40", "parser": to_string_or_empty_string},
+    {"name": "text41", "from": "text41", "parser": to_string_or_empty_string},
+]
+DOCUMENT_PARSE_PLAN = compile_parse_fields(DOCUMENT_PARSE_FIELDS)
+
+# Only the fields used by the enabled Zaak types are requested from Decos
+SELECT_FIELDS = ",".join(get_select_fields(zaken_index.values()))
+
+
+class DocumentContent:
+    """Iterable of the chunks of a streamed document. close releases the upstream response, also
+    when the content is never iterated, e.g. for HEAD requests or a 304/416 response."""
+
+    def __init__(self, chunks, document_response):
+        self.chunks = chunks
+        self.document_response = document_response
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        try:
+            if hasattr(self.chunks, "close"):
+                self.chunks.close()
+        finally:
+            self.document_response.close()
+
+
+user_keys_cache = TTLCache(DECOS_USER_KEYS_CACHE_MAXSIZE, DECOS_USER_KEYS_CACHE_TTL)
+workflow_date_cache = TTLCache(
+    DECOS_WORKFLOW_DATE_CACHE_MAXSIZE, DECOS_WORKFLOW_DATE_CACHE_TTL
 )
 
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Returns the process-wide session used for all requests to the Decos api.
+
+    The session keeps connections to the Decos host alive between requests so TCP/TLS handshakes
+    are reused. Sessions are not shared across forked (uwsgi) worker processes.
+    """
+    global _session, _session_pid
+
+    pid = os.getpid()
+
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=DECOS_API_POOL_MAXSIZE,
+                    # request_slot caps the requests in flight, a connection that is held
+                    # longer (e.g. by a slow download) must not block the other requests
+                    pool_block=False,
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+
+                _session = session
+                _session_pid = pid
+
+    return _session
+
 
 def get_decosjoin_adres_boeken():
     return {
@@ -91,7 +121,10 @@ def get_decosjoin_adres_boeken():
     }
 
 
-class DecosJoinConnection:
+class DecosJoinConnectionBase:
+    """The parts of a connection to the Decos api that don't do I/O, shared by the sync and the
+    asyncio (see decosjoin_service_async) clients."""
+
     def __init__(self, username, password, api_host, adres_boeken=None):
         self.username = username
         self.password = password
@@ -102,40 +135,6 @@ class DecosJoinConnection:
         self.api_location = "/decosweb/aspx/api/v1/"
         self.api_url = f"{self.api_host}{self.api_location}"
 
-    def get_response(self, *args, **kwargs):
-        """Easy to mock intermediate function."""
-        return requests.get(*args, **kwargs)
-
-    def post_response(self, *args, **kwargs):
-        """Easy to mock intermediate function."""
-        return requests.post(*args, **kwargs)
-
-    def request(self, url, method="get", json=None):
-        """Makes a request to the decos join api with HTTP basic auth credentials added."""
-        if method == "get":
-            response = self.get_response(
-                url,
-                auth=HTTPBasicAuth(self.username, self.password),
-                headers={"Accept": "application/itemdata"},
-                timeout=DECOS_API_REQUEST_TIMEOUT,
-            )
-        elif method == "post":
-            response = self.post_response(
-                url,
-                auth=HTTPBasicAuth(self.username, self.password),
-                headers={"Accept": "application/itemdata"},
-                json=json,
-                timeout=DECOS_API_REQUEST_TIMEOUT,
-            )
-        else:
-            raise RuntimeError("Method needs to be GET or POST")
-
-        if response.status_code == 200:
-            json = response.json()
-            return json
-        else:
-            response.raise_for_status()
-
     def get_search_query_json(self, bsn: str, book_key: str):
         return {
             "bookKey": book_key,
@@ -151,36 +150,23 @@ class DecosJoinConnection:
             },
         }
 
-    def get_user_keys(self, profile_type, user_identifier):
-        """Retrieve the internal ids used for a user."""
-        keys = []
-
-        adres_boeken = self.adres_boeken[profile_type]
-
-        def get_key(boek):
-            keys = []
-            url = f"{self.api_url}search/books?properties=false"
-
-            res_json = self.request(
-                url,
-                json=self.get_search_query_json(user_identifier, boek),
-                method="post",
-            )
+    def get_user_keys_cache_key(self, profile_type, user_identifier):
+        return hash_key(profile_type, user_identifier, *self.adres_boeken[profile_type])
 
-            if res_json["itemDataResultSet"]["count"] > 0:
-                for item in res_json["itemDataResultSet"]["content"]:
-                    user_key = item["key"]
-                    keys.append(user_key)
-
-            return keys
+    def invalidate_user_keys(self, profile_type, user_identifier):
+        """Removes the cached internal ids of a user."""
+        user_keys_cache.delete(
+            self.get_user_keys_cache_key(profile_type, user_identifier)
+        )
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=12) as executor:
-            results = executor.map(
-                get_key, adres_boeken, timeout=DECOS_API_REQUEST_TIMEOUT
-            )
+    @staticmethod
+    def get_keys_from_search_response(res_json):
+        keys = []
 
-        for result in results:
-            keys.extend(result)
+        if res_json["itemDataResultSet"]["count"] > 0:
+            for item in res_json["itemDataResultSet"]["content"]:
+                user_key = item["key"]
+                keys.append(user_key)
 
         return keys
 
@@ -192,86 +178,347 @@ class DecosJoinConnection:
         value = value.lower()
         return value in test_list
 
-    def transform(self, zaken_source, user_identifier):  # noqa: C901
-        new_zaken = []
-        deferred_zaken = []
+    def transform_zaak(self, zaak_source, user_identifier):
+        """Transforms a single source item, returns a [zaak, Zaak class] pair or None when the item
+        is not included in the zaken."""
+        source_fields = zaak_source["fields"]
 
-        for zaak_source in zaken_source:
-            source_fields = zaak_source["fields"]
+        # Cannot reliably determine the zaaktype of this zaak, or the Zaak is not defined
+        Zaak = zaken_index.get(source_fields.get("text45"))
 
-            # Cannot reliably determine the zaaktype of this zaak
-            if "text45" not in source_fields:
-                continue
+        if Zaak is None:
+            return None
 
-            source_fields.update({"id": zaak_source["key"]})
+        new_zaak = Zaak(source_fields, zaak_source["key"]).result()
 
-            zaak_type = source_fields["text45"]
+        if new_zaak is None:
+            return None
 
-            # Zaak is defined
-            if zaak_type not in zaken_index:
-                continue
+        # These matching conditions are used to prevent these items from being included in the returned list of zaken
+        if self.is_list_match(
+            new_zaak,
+            "description",
+            ["wacht op online betaling", "wacht op ideal betaling"],
+        ):
+            return None
 
-            Zaak = zaken_index[zaak_type]
-            new_zaak = Zaak(source_fields).result()
+        if self.is_list_match(
+            new_zaak,
+            "decision",
+            ["buiten behandeling", "geannuleerd", "geen aanvraag of dubbel"],
+        ):
+            return None
 
-            if new_zaak is None:
-                continue
+        description = new_zaak["description"]
+        if description and description.lower().startswith("*verwijder"):
+            return None
 
-            # These matching conditions are used to prevent these items from being included in the returned list of zaken
-            if self.is_list_match(
-                new_zaak,
-                "description",
-                ["wacht op online betaling", "wacht op ideal betaling"],
-            ):
-                continue
+        return [new_zaak, Zaak]
 
-            if self.is_list_match(
-                new_zaak,
-                "decision",
-                ["buiten behandeling", "geannuleerd", "geen aanvraag of dubbel"],
-            ):
-                continue
+    @staticmethod
+    def sort_zaken(new_zaken, deferred_zaken, user_identifier):
+        """Returns the zaken and the (transformed) deferred zaken sorted by identifier."""
+        deferred_zaken.sort(key=lambda zaak: zaak.get("caseType"))
 
-            if new_zaak["description"] and new_zaak["description"].lower().startswith(
-                "*verwijder"
-            ):
-                continue
+        zaken = sorted(new_zaken + deferred_zaken, key=lambda zaak: zaak["identifier"])
+
+        # This url can be used to retrieve matching document attachments for this particular zaak
+        encrypted_ids = encrypt_many((zaak["id"], user_identifier) for zaak in zaken)
+
+        for zaak, encrypted_id in zip(zaken, encrypted_ids):
+            zaak["documentsUrl"] = f"/decosjoin/listdocuments/{encrypted_id}"
+
+        return zaken
+
+    @staticmethod
+    def get_paged_url(url):
+        req = PreparedRequest()
+        req.prepare_url(url, {"top": PAGE_SIZE})  # append top get param
+        return req.url
+
+    @staticmethod
+    def get_page_offsets(first_page):
+        """Returns the skip offsets of the pages following first_page."""
+        end = math.ceil(first_page["count"] / PAGE_SIZE) * PAGE_SIZE
+        return range(PAGE_SIZE, end, PAGE_SIZE)
+
+    @staticmethod
+    def release_items(content: list):
+        """Yields the items of content, removing them from the list so each item can be released
+        as soon as the consumer is done with it."""
+        content.reverse()
+
+        while content:
+            yield content.pop()
+
+    def get_zaken_url(self, user_key):
+        return self.get_paged_url(
+            f"{self.api_url}items/{user_key}/folders?select={SELECT_FIELDS}"
+        )
+
+    @staticmethod
+    def get_document_data_from_response(res_json):
+        content = res_json["content"]
+        if content:
+            for i in content[::-1]:
+                is_pdf = i["fields"].get("bol10", False)
+                if is_pdf:
+                    return {"is_pdf": is_pdf, "doc_key": i["key"]}
+        return {
+            "is_pdf": False,
+        }
+
+    def get_documents_url(self, zaak_id):
+        return f"{self.api_url}items/{zaak_id}/documents?select=subject1,sequence,mark,text39,text40,text41,itemtype_key"
+
+    @staticmethod
+    def get_document_meta_data(item):
+        """Returns the meta data of a document item, None if the document is not to be shown."""
+        document_source = item["fields"]
+
+        if document_source["itemtype_key"].lower() != "document":
+            return None
+
+        document_meta_data = get_compiled_fields(DOCUMENT_PARSE_PLAN, document_source)
+
+        if (
+            document_meta_data["text39"].lower() == "definitief"
+            and document_meta_data["text40"].lower() in ["openbaar", "beperkt openbaar"]
+            and document_meta_data["text41"].lower() != "nvt"
+        ):
+            return document_meta_data
+
+        return None
+
+    @staticmethod
+    def to_documents(documents, identifier):
+        """Returns the pdf documents from a list of [document meta data, document data] pairs
+        ordered by sequence."""
+        documents = [
+            [document_meta_data, doc_data]
+            for [document_meta_data, doc_data] in documents
+            if doc_data["is_pdf"]
+        ]
+        encrypted_keys = encrypt_many(
+            (doc_data["doc_key"], identifier) for [_, doc_data] in documents
+        )
+
+        new_docs = []
+
+        for [document_meta_data, _], encrypted_key in zip(documents, encrypted_keys):
+            document_meta_data["url"] = f"/decosjoin/document/{encrypted_key}"
+
+            del document_meta_data["text39"]
+            del document_meta_data["text40"]
+            del document_meta_data["text41"]
+
+            new_docs.append(document_meta_data)
+
+        new_docs.sort(key=lambda x: x["sequence"])
+
+        for doc in new_docs:
+            del doc["sequence"]
+
+        return new_docs
 
-            # This url can be used to retrieve matching document attachments for this particular zaak
-            new_zaak["documentsUrl"] = (
-                f"/decosjoin/listdocuments/{encrypt(zaak_source['key'], user_identifier)}"
+    @staticmethod
+    def get_document_headers(response_headers):
+        """Returns the headers of a document response to pass through to the client."""
+        document = {"Content-Type": response_headers["Content-Type"]}
+
+        for header in [
+            "Content-Length",
+            "Content-Disposition",
+            "Content-Range",
+            "Last-Modified",
+        ]:
+            if header in response_headers:
+                document[header] = response_headers[header]
+
+        # The content is decoded, the length and ranges of an encoded body do not apply
+        if "Content-Encoding" in response_headers:
+            document.pop("Content-Length", None)
+            document.pop("Content-Range", None)
+
+        return document
+
+    @staticmethod
+    def get_document_etag(document_id):
+        """The content of a document does not change, its ETag is derived from the id only so
+        conditional requests can be answered without requesting the document from Decos.
+        """
+        return hashlib.sha256(f"decosjoin-document:{document_id}".encode()).hexdigest()
+
+    def get_cached_workflow_dates(self, zaak_id: str, step_titles: list):
+        """Returns the cached dates of the workflow steps and the step titles that are not cached."""
+        workflow_step_dates = {}
+        uncached_step_titles = []
+
+        for step_title in step_titles:
+            workflow_step_date = workflow_date_cache.get(
+                (self.api_url, zaak_id, step_title)
             )
 
-            if Zaak.defer_transform:
-                deferred_zaken.append([new_zaak, Zaak])
+            if workflow_step_date is NOT_FOUND:
+                uncached_step_titles.append(step_title)
             else:
-                new_zaken.append(new_zaak)
+                workflow_step_dates[step_title] = workflow_step_date
+
+        return workflow_step_dates, uncached_step_titles
+
+    def cache_workflow_dates(self, zaak_id: str, workflow_step_dates: dict):
+        for step_title, workflow_step_date in workflow_step_dates.items():
+            workflow_date_cache.set(
+                (self.api_url, zaak_id, step_title),
+                workflow_step_date,
+                (
+                    DECOS_WORKFLOW_DATE_CACHE_TTL
+                    if workflow_step_date is not None
+                    else DECOS_WORKFLOW_DATE_CACHE_MISS_TTL
+                ),
+            )
+
+    def get_workflows_url(self, zaak_id: str):
+        return f"{self.api_url}items/{zaak_id}/workflows"
+
+    def get_workflow_steps_url(self, all_workflows_response, step_titles: list):
+        """Returns the url of the steps in step_titles of the last workflow, None if there are no
+        workflows."""
+        if not all_workflows_response or all_workflows_response["count"] == 0:
+            return None
+
+        # Take last workflow key
+        worflow_key = all_workflows_response["content"][-1]["key"]
+        step_filter = " or ".join(
+            f"text7 eq '{step_title}'" for step_title in step_titles
+        )
+        return f"{self.api_url}items/{worflow_key}/workflowlinkinstances?properties=false&fetchParents=false&select=mark,date1,date2,text7,sequence&orderBy=sequence&filter={step_filter}"
+
+    @staticmethod
+    def get_workflow_dates_from_response(single_workflow_response, step_titles: list):
+        workflow_step_dates = dict.fromkeys(step_titles)
+
+        if not single_workflow_response:
+            return workflow_step_dates
+
+        for workflow_step in single_workflow_response["content"]:
+            if (
+                "text7" in workflow_step["fields"]
+                and "date1" in workflow_step["fields"]
+                and workflow_step["fields"]["text7"] in workflow_step_dates
+            ):
+                logging.debug(workflow_step["fields"])
+                workflow_step_dates[workflow_step["fields"]["text7"]] = to_date(
+                    workflow_step["fields"]["date1"]
+                )
+
+        return workflow_step_dates
 
-        deferred_zaken.sort(key=lambda x: x[0].get("caseType"))
+
+class DecosJoinConnection(DecosJoinConnectionBase):
+    def get_response(self, *args, **kwargs):
+        """Easy to mock intermediate function."""
+        return get_session().get(*args, **kwargs)
+
+    def post_response(self, *args, **kwargs):
+        """Easy to mock intermediate function."""
+        return get_session().post(*args, **kwargs)
+
+    def request(self, url, method="get", json=None):
+        """Makes a request to the decos join api with HTTP basic auth credentials added."""
+        if method not in ["get", "post"]:
+            raise RuntimeError("Method needs to be GET or POST")
+
+        with scheduler.request_slot():
+            if method == "get":
+                response = self.get_response(
+                    url,
+                    auth=HTTPBasicAuth(self.username, self.password),
+                    headers={"Accept": "application/itemdata"},
+                    timeout=DECOS_API_REQUEST_TIMEOUT,
+                )
+            else:
+                response = self.post_response(
+                    url,
+                    auth=HTTPBasicAuth(self.username, self.password),
+                    headers={"Accept": "application/itemdata"},
+                    json=json,
+                    timeout=DECOS_API_REQUEST_TIMEOUT,
+                )
+
+        if response.status_code == 200:
+            json = response.json()
+            return json
+        else:
+            response.raise_for_status()
+
+    def get_user_keys(self, profile_type, user_identifier):
+        """Retrieve the internal ids used for a user."""
+        cache_key = self.get_user_keys_cache_key(profile_type, user_identifier)
+        cached_keys = user_keys_cache.get(cache_key)
+
+        if cached_keys is not NOT_FOUND:
+            return list(cached_keys)
+
+        keys = []
+
+        adres_boeken = self.adres_boeken[profile_type]
+
+        def get_key(boek):
+            res_json = self.request(
+                f"{self.api_url}search/books?properties=false",
+                json=self.get_search_query_json(user_identifier, boek),
+                method="post",
+            )
+            return self.get_keys_from_search_response(res_json)
+
+        results = scheduler.map(get_key, adres_boeken)
+
+        for result in results:
+            keys.extend(result)
+
+        # A user without keys yet might get them any moment, only cache known users
+        if keys:
+            user_keys_cache.set(cache_key, tuple(keys))
+
+        return keys
+
+    def transform(self, zaken_source, user_identifier):
+        """Transforms the (streamed) source items into zaken. Deferred transforms are queued as soon
+        as a zaak is encountered so they run while the remaining source items are still coming in.
+        """
+        new_zaken = []
+        deferred_results = []
 
         # In parallel
         # Makes it possible to defer adding the zaak to the zaken response for example to:
         # - Adding dateWorkflowActive by querying other Api's
-        def perform_deferred_transform(zaak_tuple):
-            [deferred_zaak, Zaak_cls] = zaak_tuple
+        def perform_deferred_transform(deferred_zaak, Zaak_cls):
             return Zaak_cls.defer_transform(
                 zaak_deferred=deferred_zaak,
                 decosjoin_service=self,
             )
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=12) as executor:
-            results = executor.map(
-                perform_deferred_transform,
-                deferred_zaken,
-                timeout=DECOS_API_REQUEST_TIMEOUT,
-            )
+        for zaak_source in zaken_source:
+            transformed = self.transform_zaak(zaak_source, user_identifier)
 
-        for result in results:
-            new_zaken.append(result)
+            if transformed is None:
+                continue
+
+            [new_zaak, Zaak] = transformed
+
+            if Zaak.defer_transform:
+                deferred_results.append(
+                    scheduler.submit(perform_deferred_transform, new_zaak, Zaak)
+                )
+            else:
+                new_zaken.append(new_zaak)
 
-        zaken_source_sorted = sorted(new_zaken, key=lambda zaak: zaak["identifier"])
+        deferred_zaken = [
+            deferred_result.result() for deferred_result in deferred_results
+        ]
 
-        return zaken_source_sorted
+        return self.sort_zaken(new_zaken, deferred_zaken, user_identifier)
 
     def get_page(self, url, offset=None):
         """Get a single page for url. When offset is provided add that to the url."""
@@ -282,149 +529,208 @@ class DecosJoinConnection:
         logging.debug(res_json)
         return res_json
 
-    def get_all_pages(self, url):
-        """Get 'content' from all pages for the provided url"""
+    def iter_pages(self, url, first_page, parallel=True):
+        """Yield the 'content' items of first_page followed by those of the remaining pages of the
+        paged url. When parallel is True the remaining pages are fetched in the background while
+        the items of the previous pages are consumed. Pages are released once their items are yielded.
+        """
+        offsets = self.get_page_offsets(first_page)
+
+        content = first_page["content"]
+        del first_page
+
+        if not parallel or len(offsets) < 2:
+            yield from self.release_items(content)
+            for offset in offsets:
+                yield from self.release_items(self.get_page(url, offset)["content"])
+            return
+
+        # Keep at most DECOS_API_PAGE_WORKERS pages of this listing in progress
+        offsets = iter(offsets)
+        pages = deque(
+            scheduler.submit(self.get_page, url, offset)
+            for offset in islice(offsets, DECOS_API_PAGE_WORKERS)
+        )
 
-        req = PreparedRequest()
-        req.prepare_url(url, {"top": PAGE_SIZE})  # append top get param
-        url = req.url
+        try:
+            yield from self.release_items(content)
 
-        items = []
-        # fetch one page to get the first part of the data and item count
-        res = self.get_page(url)
+            while pages:
+                page = pages.popleft().result()
 
-        end = math.ceil(res["count"] / PAGE_SIZE) * PAGE_SIZE
-        items.extend(res["content"])
+                for offset in islice(offsets, 1):
+                    pages.append(scheduler.submit(self.get_page, url, offset))
 
-        for offset in range(PAGE_SIZE, end, PAGE_SIZE):
-            res = self.get_page(url, offset)
-            items.extend(res["content"])
+                content = page["content"]
+                del page
+                yield from self.release_items(content)
+        finally:
+            for future in pages:
+                future.cancel()
 
-        return items
+    def iter_all_pages(self, url, parallel=True):
+        """Yield the 'content' items from all pages for the provided url, page by page."""
+        url = self.get_paged_url(url)
 
-    def get_zaken(self, profile_type, user_identifier):
-        zaken_source = []
-        user_keys = self.get_user_keys(profile_type, user_identifier)
+        # fetch one page to get the first part of the data and item count
+        yield from self.iter_pages(url, self.get_page(url), parallel)
+
+    def get_all_pages(self, url, parallel=True):
+        """Get 'content' from all pages for the provided url. When parallel is True the pages
+        after the first one are fetched in parallel, the items are returned in page order.
+        """
+        return list(self.iter_all_pages(url, parallel))
 
-        def fetch_zaken(key):
-            url = f"{self.api_url}items/{key}/folders?select={SELECT_FIELDS}"
-            zaken = self.get_all_pages(url)
-            return zaken
+    def iter_zaken_source(self, user_keys):
+        """Yield the source items of the zaken of all user_keys. The first pages are fetched in
+        parallel, the remaining pages are streamed per user key."""
+        urls = [self.get_zaken_url(key) for key in user_keys]
 
         # execute in parallel
-        with concurrent.futures.ThreadPoolExecutor(max_workers=12) as executor:
-            results = executor.map(
-                fetch_zaken, user_keys, timeout=DECOS_API_REQUEST_TIMEOUT
-            )
+        first_pages = scheduler.map(self.get_page, urls)
 
-        for result in results:
-            zaken_source.extend(result)
+        first_pages.reverse()
+
+        for url in urls:
+            yield from self.iter_pages(url, first_pages.pop())
+
+    def get_zaken(self, profile_type, user_identifier):
+        user_keys = self.get_user_keys(profile_type, user_identifier)
 
-        zaken = self.transform(zaken_source, user_identifier)
+        zaken = self.transform(self.iter_zaken_source(user_keys), user_identifier)
         return zaken
 
     def get_document_data(self, document_id: str):
         res_json = self.request(f"{self.api_url}items/{document_id}/blob?select=bol10")
-
-        content = res_json["content"]
-        if content:
-            for i in content[::-1]:
-                is_pdf = i["fields"].get("bol10", False)
-                if is_pdf:
-                    return {"is_pdf": is_pdf, "doc_key": i["key"]}
-        return {
-            "is_pdf": False,
-        }
+        return self.get_document_data_from_response(res_json)
 
     def get_documents(self, zaak_id, identifier):
-        url = f"{self.api_url}items/{zaak_id}/documents?select=subject1,sequence,mark,text39,text40,text41,itemtype_key"
+        res = self.get_all_pages(self.get_documents_url(zaak_id))
 
-        res = self.get_all_pages(url)
+        documents = []
 
-        parse_fields = [
-            {"name": "title", "from": "text41", "parser": to_string_or_empty_string},
-            {"name": "id", "from": "mark", "parser": to_string},
-            {"name": "sequence", "from": "sequence", "parser": to_int},
-            {"name": "text39", "from": "text39", "parser": to_string_or_empty_string},
-            {"name": "text40", "from": "text40", "parser": to_string_or_empty_string},
-            {"name": "text41", "from": "text41", "parser": to_string_or_empty_string},
-        ]
+        for item in res:
+            document_meta_data = self.get_document_meta_data(item)
 
-        new_docs = []
+            if document_meta_data is not None:
+                documents.append([document_meta_data, item["key"]])
 
-        for item in res:
-            document_source = item["fields"]
-            if document_source["itemtype_key"].lower() == "document":
-                document_meta_data = get_fields(parse_fields, document_source)
+        # Every request has its own timeout, the number of documents is not bounded
+        documents_data = scheduler.map(
+            self.get_document_data, [key for [_, key] in documents]
+        )
 
-                if (
-                    document_meta_data["text39"].lower() == "definitief"
-                    and document_meta_data["text40"].lower()
-                    in ["openbaar", "beperkt openbaar"]
-                    and document_meta_data["text41"].lower() != "nvt"
-                ):
-                    doc_data = self.get_document_data(item["key"])
+        return self.to_documents(
+            [
+                [document_meta_data, doc_data]
+                for [document_meta_data, _], doc_data in zip(documents, documents_data)
+            ],
+            identifier,
+        )
 
-                    if doc_data["is_pdf"]:
-                        document_meta_data["url"] = (
-                            f"/decosjoin/document/{encrypt(doc_data['doc_key'], identifier)}"
-                        )
+    @staticmethod
+    def iter_document_content(document_response):
+        try:
+            yield from document_response.iter_content(DECOS_API_BLOB_CHUNK_SIZE)
+        finally:
+            document_response.close()
+
+    def get_document_blob(self, document_id, stream=False, byte_range=None):
+        """Returns the document with the headers to pass through to the client. With stream the
+        file_data is an iterator of chunks which are read from Decos while it is consumed.
+        The byte_range (Range header value) is forwarded, Decos answers with the full document
+        when it does not support the range. Full documents are served from, and added to, the
+        blob cache when it is enabled.
+        """
+        blob_cache = get_blob_cache()
+
+        if blob_cache:
+            document = blob_cache.get(document_id)
+
+            if document:
+                if not stream:
+                    document["file_data"] = b"".join(document["file_data"])
+                return document
 
-                        del document_meta_data["text39"]
-                        del document_meta_data["text40"]
-                        del document_meta_data["text41"]
+        url_blob_content = f"{self.api_url}items/{document_id}/content"
 
-                        new_docs.append(document_meta_data)
+        headers = {"Accept": "application/octet-stream"}
 
-        new_docs.sort(key=lambda x: x["sequence"])
+        if byte_range:
+            headers["Range"] = byte_range
 
-        for doc in new_docs:
-            del doc["sequence"]
+        with scheduler.request_slot():
+            document_response = self.get_response(
+                url_blob_content,
+                auth=HTTPBasicAuth(self.username, self.password),
+                headers=headers,
+                stream=stream,
+                # With stream the read timeout applies to every chunk, not the whole document
+                timeout=DECOS_API_REQUEST_TIMEOUT,
+            )
 
-        return new_docs
+        if document_response.status_code not in [200, 206]:
+            document_response.close()
+            document_response.raise_for_status()
 
-    def get_document_blob(self, document_id):
-        url_blob_content = f"{self.api_url}items/{document_id}/content"
+        document = self.get_document_headers(document_response.headers)
+        is_cacheable = blob_cache and "Content-Range" not in document
 
-        document_response = self.get_response(
-            url_blob_content,
-            auth=HTTPBasicAuth(self.username, self.password),
-            headers={"Accept": "application/octet-stream"},
-        )
+        if stream:
+            file_data = self.iter_document_content(document_response)
 
-        return {
-            "Content-Type": document_response.headers["Content-Type"],
-            "file_data": document_response.content,
-        }
+            if is_cacheable:
+                file_data = blob_cache.tee(document_id, dict(document), file_data)
 
-    def get_workflow_date_by_step_title(self, zaak_id: str, step_title: str):
-        all_workflows_response = self.request(
-            f"{self.api_url}items/{zaak_id}/workflows"
-        )
+            file_data = DocumentContent(file_data, document_response)
+        else:
+            file_data = document_response.content
 
-        if all_workflows_response and all_workflows_response["count"] > 0:
-            # Take last workflow key
+            if is_cacheable:
+                blob_cache.put(document_id, document, file_data)
 
-            worflow_key = all_workflows_response["content"][-1]["key"]
-            single_workflow_url = f"{self.api_url}items/{worflow_key}/workflowlinkinstances?properties=false&fetchParents=false&select=mark,date1,date2,text7,sequence&orderBy=sequence&filter=text7 eq '{step_title}'"
-            single_workflow_response = self.request(single_workflow_url)
+        document["file_data"] = file_data
 
-            if not single_workflow_response["content"]:
-                return None
+        return document
 
-            workflow_step_date = None
-            logging.debug(
-                f"Find workflow step for {zaak_id} by step title {step_title}"
+    def get_workflow_date_by_step_title(self, zaak_id: str, step_title: str):
+        return self.get_workflow_dates_by_step_titles(zaak_id, [step_title])[step_title]
+
+    def get_workflow_dates_by_step_titles(self, zaak_id: str, step_titles: list):
+        """Returns a dict with the date of every workflow step in step_titles. Once a step has a
+        date it doesn't change, the date is cached. Steps without a date are cached for a shorter
+        period. The steps that are not cached are retrieved together."""
+        workflow_step_dates, uncached_step_titles = self.get_cached_workflow_dates(
+            zaak_id, step_titles
+        )
+
+        if uncached_step_titles:
+            fetched_step_dates = self.fetch_workflow_dates_by_step_titles(
+                zaak_id, uncached_step_titles
             )
-            for workflow_step in single_workflow_response["content"]:
-                if (
-                    "text7" in workflow_step["fields"]
-                    and "date1" in workflow_step["fields"]
-                    and workflow_step["fields"]["text7"] == step_title
-                ):
-                    logging.debug(workflow_step["fields"])
-                    workflow_step_date = to_date(workflow_step["fields"]["date1"])
+            fetched_step_dates = {
+                step_title: fetched_step_dates.get(step_title)
+                for step_title in uncached_step_titles
+            }
+            self.cache_workflow_dates(zaak_id, fetched_step_dates)
+            workflow_step_dates.update(fetched_step_dates)
+
+        return workflow_step_dates
+
+    def fetch_workflow_dates_by_step_titles(self, zaak_id: str, step_titles: list):
+        """Retrieves the dates of the workflow steps in step_titles with one workflows and one
+        workflowlinkinstances request."""
+        all_workflows_response = self.request(self.get_workflows_url(zaak_id))
+
+        single_workflow_url = self.get_workflow_steps_url(
+            all_workflows_response, step_titles
+        )
 
-            return workflow_step_date
+        if not single_workflow_url:
+            return dict.fromkeys(step_titles)
 
-        return None
+        logging.debug(f"Find workflow steps for {zaak_id} by step titles {step_titles}")
+
+        return self.get_workflow_dates_from_response(
+            self.request(single_workflow_url), step_titles
+        )
@@ -0,0 +1,369 @@
+import asyncio
+import logging
+import os
+import ssl
+import threading
+from collections import deque
+from itertools import islice
+
+import httpx
+
+from app.cache import NOT_FOUND
+from app.config import (
+    DECOS_API_ASYNC_MAX_IN_FLIGHT,
+    DECOS_API_PAGE_WORKERS,
+    DECOS_API_POOL_MAXSIZE,
+    DECOS_API_REQUEST_TIMEOUT,
+    get_requests_ca_bundle,
+)
+from app.decosjoin_service import DecosJoinConnectionBase, user_keys_cache
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+# Only used on the event loop of the process
+_client = None
+_request_slots = None
+
+
+def get_event_loop():
+    """Returns the process-wide event loop on which all requests of the asyncio client run.
+
+    The loop runs in a background thread so the Decos requests of all (uwsgi) request threads of a
+    process are multiplexed on it. Loops are not shared across forked worker processes.
+    """
+    global _loop, _loop_pid, _client, _request_slots
+
+    pid = os.getpid()
+
+    if _loop is None or _loop_pid != pid:
+        with _loop_lock:
+            if _loop is None or _loop_pid != pid:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="decosjoin-async", daemon=True
+                ).start()
+
+                _client = None
+                _request_slots = None
+                _loop = loop
+                _loop_pid = pid
+
+    return _loop
+
+
+def run_async(coroutine):
+    """Runs the coroutine on the process-wide event loop and waits for its result."""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result()
+
+
+def get_ssl_verify():
+    """httpx does not read REQUESTS_CA_BUNDLE, the client verifies with the same CA bundle as the
+    sync client. Without the bundle the default (certifi) is used."""
+    ca_bundle = get_requests_ca_bundle()
+
+    if not ca_bundle:
+        return True
+
+    return ssl.create_default_context(cafile=ca_bundle)
+
+
+def get_async_client():
+    """Returns the http client with the keep-alive connections to the Decos api."""
+    global _client
+
+    if _client is None:
+        _client = httpx.AsyncClient(
+            verify=get_ssl_verify(),
+            limits=httpx.Limits(
+                max_connections=DECOS_API_ASYNC_MAX_IN_FLIGHT,
+                max_keepalive_connections=DECOS_API_POOL_MAXSIZE,
+            ),
+        )
+
+    return _client
+
+
+def get_request_slots():
+    global _request_slots
+
+    if _request_slots is None:
+        _request_slots = asyncio.Semaphore(DECOS_API_ASYNC_MAX_IN_FLIGHT)
+
+    return _request_slots
+
+
+class PrefetchedWorkflowDates:
+    """Passed as decosjoin_service to Zaak.defer_transform by the asyncio client. Answers the
+    workflow date lookups with the dates that were retrieved beforehand."""
+
+    def __init__(self, workflow_step_dates: dict):
+        self.workflow_step_dates = workflow_step_dates
+
+    def get_workflow_date_by_step_title(self, zaak_id: str, step_title: str):
+        return self.workflow_step_dates[step_title]
+
+    def get_workflow_dates_by_step_titles(self, zaak_id: str, step_titles: list):
+        return {
+            step_title: self.workflow_step_dates[step_title]
+            for step_title in step_titles
+        }
+
+
+class AsyncDecosJoinConnection(DecosJoinConnectionBase):
+    """Asyncio variant of DecosJoinConnection. The methods that call the Decos api are coroutines
+    which should run on the process-wide event loop, see run_async. Document blobs are streamed
+    by DecosJoinConnection, see the /decosjoin/document route."""
+
+    async def get_response(self, *args, **kwargs):
+        """Easy to mock intermediate function."""
+        return await get_async_client().get(*args, **kwargs)
+
+    async def post_response(self, *args, **kwargs):
+        """Easy to mock intermediate function."""
+        return await get_async_client().post(*args, **kwargs)
+
+    async def request(self, url, method="get", json=None):
+        """Makes a request to the decos join api with HTTP basic auth credentials added."""
+        if method not in ["get", "post"]:
+            raise RuntimeError("Method needs to be GET or POST")
+
+        async with get_request_slots():
+            if method == "get":
+                response = await self.get_response(
+                    url,
+                    auth=(self.username, self.password),
+                    headers={"Accept": "application/itemdata"},
+                    timeout=DECOS_API_REQUEST_TIMEOUT,
+                )
+            else:
+                response = await self.post_response(
+                    url,
+                    auth=(self.username, self.password),
+                    headers={"Accept": "application/itemdata"},
+                    json=json,
+                    timeout=DECOS_API_REQUEST_TIMEOUT,
+                )
+
+        if response.status_code == 200:
+            json = response.json()
+            return json
+        else:
+            response.raise_for_status()
+
+    async def get_user_keys(self, profile_type, user_identifier):
+        """Retrieve the internal ids used for a user."""
+        cache_key = self.get_user_keys_cache_key(profile_type, user_identifier)
+        cached_keys = user_keys_cache.get(cache_key)
+
+        if cached_keys is not NOT_FOUND:
+            return list(cached_keys)
+
+        async def get_key(boek):
+            res_json = await self.request(
+                f"{self.api_url}search/books?properties=false",
+                json=self.get_search_query_json(user_identifier, boek),
+                method="post",
+            )
+            return self.get_keys_from_search_response(res_json)
+
+        results = await asyncio.gather(
+            *[get_key(boek) for boek in self.adres_boeken[profile_type]]
+        )
+
+        keys = [key for result in results for key in result]
+
+        # A user without keys yet might get them any moment, only cache known users
+        if keys:
+            user_keys_cache.set(cache_key, tuple(keys))
+
+        return keys
+
+    async def perform_deferred_transform(self, deferred_zaak, Zaak_cls):
+        workflow_step_dates = await self.get_workflow_dates_by_step_titles(
+            deferred_zaak["id"], Zaak_cls.get_workflow_step_titles()
+        )
+        return Zaak_cls.defer_transform(
+            zaak_deferred=deferred_zaak,
+            decosjoin_service=PrefetchedWorkflowDates(workflow_step_dates),
+        )
+
+    async def transform(self, zaken_source, user_identifier):
+        """Transforms the source items of an async iterable into zaken. The workflow dates of the
+        deferred zaken are requested as soon as a zaak is encountered."""
+        new_zaken = []
+        deferred_results = []
+
+        try:
+            async for zaak_source in zaken_source:
+                transformed = self.transform_zaak(zaak_source, user_identifier)
+
+                if transformed is None:
+                    continue
+
+                [new_zaak, Zaak] = transformed
+
+                if Zaak.defer_transform:
+                    deferred_results.append(
+                        asyncio.ensure_future(
+                            self.perform_deferred_transform(new_zaak, Zaak)
+                        )
+                    )
+                else:
+                    new_zaken.append(new_zaak)
+
+            deferred_zaken = await asyncio.gather(*deferred_results)
+        finally:
+            for deferred_result in deferred_results:
+                deferred_result.cancel()
+
+        return self.sort_zaken(new_zaken, list(deferred_zaken), user_identifier)
+
+    async def get_page(self, url, offset=None):
+        """Get a single page for url. When offset is provided add that to the url."""
+        if offset:
+            url += f"&skip={offset}"
+        res_json = await self.request(url)
+        logging.debug(f"Get page {url} - offset: {offset}")
+        logging.debug(res_json)
+        return res_json
+
+    async def iter_pages(self, url, first_page):
+        """Yield the 'content' items of first_page followed by those of the remaining pages of the
+        paged url. The next pages are fetched while the items of the previous pages are consumed.
+        """
+        offsets = iter(self.get_page_offsets(first_page))
+
+        content = first_page["content"]
+        del first_page
+
+        # Keep at most DECOS_API_PAGE_WORKERS pages of this listing in progress
+        pages = deque(
+            asyncio.ensure_future(self.get_page(url, offset))
+            for offset in islice(offsets, DECOS_API_PAGE_WORKERS)
+        )
+
+        try:
+            for item in self.release_items(content):
+                yield item
+
+            while pages:
+                page = await pages.popleft()
+
+                for offset in islice(offsets, 1):
+                    pages.append(asyncio.ensure_future(self.get_page(url, offset)))
+
+                content = page["content"]
+                del page
+
+                for item in self.release_items(content):
+                    yield item
+        finally:
+            for task in pages:
+                task.cancel()
+
+    async def iter_all_pages(self, url):
+        """Yield the 'content' items from all pages for the provided url, page by page."""
+        url = self.get_paged_url(url)
+
+        # fetch one page to get the first part of the data and item count
+        async for item in self.iter_pages(url, await self.get_page(url)):
+            yield item
+
+    async def get_all_pages(self, url):
+        """Get 'content' from all pages for the provided url"""
+        return [item async for item in self.iter_all_pages(url)]
+
+    async def iter_zaken_source(self, user_keys):
+        """Yield the source items of the zaken of all user_keys. The first pages are fetched
+        concurrently, the remaining pages are streamed per user key."""
+        urls = [self.get_zaken_url(key) for key in user_keys]
+
+        first_pages = await asyncio.gather(*[self.get_page(url) for url in urls])
+        first_pages.reverse()
+
+        for url in urls:
+            async for item in self.iter_pages(url, first_pages.pop()):
+                yield item
+
+    async def get_zaken(self, profile_type, user_identifier):
+        user_keys = await self.get_user_keys(profile_type, user_identifier)
+
+        zaken = await self.transform(self.iter_zaken_source(user_keys), user_identifier)
+        return zaken
+
+    async def get_document_data(self, document_id: str):
+        res_json = await self.request(
+            f"{self.api_url}items/{document_id}/blob?select=bol10"
+        )
+        return self.get_document_data_from_response(res_json)
+
+    async def get_documents(self, zaak_id, identifier):
+        res = await self.get_all_pages(self.get_documents_url(zaak_id))
+
+        documents = []
+
+        for item in res:
+            document_meta_data = self.get_document_meta_data(item)
+
+            if document_meta_data is not None:
+                documents.append([document_meta_data, item["key"]])
+
+        documents_data = await asyncio.gather(
+            *[self.get_document_data(key) for [_, key] in documents]
+        )
+
+        return self.to_documents(
+            [
+                [document_meta_data, doc_data]
+                for [document_meta_data, _], doc_data in zip(documents, documents_data)
+            ],
+            identifier,
+        )
+
+    async def get_workflow_date_by_step_title(self, zaak_id: str, step_title: str):
+        workflow_step_dates = await self.get_workflow_dates_by_step_titles(
+            zaak_id, [step_title]
+        )
+        return workflow_step_dates[step_title]
+
+    async def get_workflow_dates_by_step_titles(self, zaak_id: str, step_titles: list):
+        """Returns a dict with the date of every workflow step in step_titles, see
+        DecosJoinConnection.get_workflow_dates_by_step_titles."""
+        workflow_step_dates, uncached_step_titles = self.get_cached_workflow_dates(
+            zaak_id, step_titles
+        )
+
+        if uncached_step_titles:
+            fetched_step_dates = await self.fetch_workflow_dates_by_step_titles(
+                zaak_id, uncached_step_titles
+            )
+            fetched_step_dates = {
+                step_title: fetched_step_dates.get(step_title)
+                for step_title in uncached_step_titles
+            }
+            self.cache_workflow_dates(zaak_id, fetched_step_dates)
+            workflow_step_dates.update(fetched_step_dates)
+
+        return workflow_step_dates
+
+    async def fetch_workflow_dates_by_step_titles(
+        self, zaak_id: str, step_titles: list
+    ):
+        """Retrieves the dates of the workflow steps in step_titles with one workflows and one
+        workflowlinkinstances request."""
+        all_workflows_response = await self.request(self.get_workflows_url(zaak_id))
+
+        single_workflow_url = self.get_workflow_steps_url(
+            all_workflows_response, step_titles
+        )
+
+        if not single_workflow_url:
+            return dict.fromkeys(step_titles)
+
+        logging.debug(f"Find workflow steps for {zaak_id} by step titles {step_titles}")
+
+        return self.get_workflow_dates_from_response(
+            await self.request(single_workflow_url), step_titles
+        )
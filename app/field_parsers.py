@@ -1,17 +1,49 @@
 import logging
 import re
 from datetime import date, datetime, time
+from functools import lru_cache
 from typing import Union
 from dateutil import parser
+from opentelemetry import metrics
+
+meter = metrics.get_meter(__name__)
+
+parse_failure_counter = meter.create_counter(
+    "decosjoin.field_parsers.failures",
+    description="Number of values that could not be parsed",
+)
+
+
+def compile_translations(translations: list) -> dict:
+    """Returns a dict of the lowercased "from" to the translation, None when "show" is False.
+    The first translation of a value is used, like get_translation does for the list."""
+    compiled = {}
+
+    for i in translations:
+        key = i[0].lower()
+
+        if key not in compiled:
+            compiled[key] = None if len(i) == 3 and i[2] is False else i[1]
+
+    return compiled
 
 
 def get_translation(
-    value: str, translations: list, fallbackToOriginalValue: bool = False
+    value: str, translations: Union[list, dict], fallbackToOriginalValue: bool = False
 ):
-    """Accepts a 2d list with 3 items. [ ["from", "to" "show"], ... ]"""
+    """Accepts a 2d list with 3 items. [ ["from", "to" "show"], ... ]
+    or a dict of the list compiled with compile_translations."""
     if value is None:
         return value
 
+    if isinstance(translations, dict):
+        key = value.lower()
+
+        if key in translations:
+            return translations[key]
+
+        return value if fallbackToOriginalValue else None
+
     # Find a translation
     for i in translations:
         if i[0].lower() == value.lower():
@@ -34,6 +66,30 @@ def get_fields(parse_fields, zaak_source):
     return result
 
 
+def compile_parse_fields(parse_fields) -> tuple:
+    """Returns the field configs as a tuple of (name, from, parser) entries for get_compiled_fields"""
+    return tuple(
+        (field_config["name"], field_config["from"], field_config["parser"])
+        for field_config in parse_fields
+    )
+
+
+def get_compiled_fields(parse_plan: tuple, zaak_source: dict):
+    """Like get_fields, for the parse_fields compiled with compile_parse_fields"""
+    get = zaak_source.get
+    return {key: parser(get(source_key)) for key, source_key, parser in parse_plan}
+
+
+@lru_cache(maxsize=4096)  # Many zaken of a user share the same dates
+def parse_datetime(value: str) -> datetime:
+    """Parses an ISO 8601 timestamp like the 2020-06-16T00:00:00 of Decos. Formats that
+    datetime.fromisoformat does not support are parsed with dateutil."""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return parser.isoparse(value)
+
+
 def to_date(value) -> Union[date, None]:
     if not value:
         return None
@@ -45,13 +101,52 @@ def to_date(value) -> Union[date, None]:
         return value
 
     if isinstance(value, str):
-        parsed_value = parser.isoparse(value).date()
+        parsed_value = parse_datetime(value).date()
         return parsed_value
 
     logging.error(f"Error parsing date, value: {value}")
     return None
 
 
+TIME_PATTERN = re.compile(r"([0-9]{1,2})[\.,:;]([0-9]{1,2})")
+TIME_SEPARATORS = ".,:;"
+
+
+def match_time(value: str):
+    """Returns the hour and minute like TIME_PATTERN.match does. H:MM and HH:MM, the forms used
+    mostly, are matched without the regex."""
+    if len(value) in [4, 5] and value[-3] in TIME_SEPARATORS:
+        hour = value[:-3]
+        minute = value[-2:]
+
+        if hour.isascii() and hour.isdigit() and minute.isascii() and minute.isdigit():
+            return hour, minute
+
+    matches = TIME_PATTERN.match(value)
+
+    if matches:
+        return matches.group(1), matches.group(2)
+
+    return None
+
+
+@lru_cache(maxsize=1024)
+def normalize_time(value: str) -> Union[str, None]:
+    matches = match_time(value)
+
+    if matches:
+        hour = int(matches[0])
+        minute = int(matches[1])
+
+        if (0 <= hour <= 23 and 0 <= minute <= 59) or (hour == 24 and minute == 00):
+            if minute < 6:
+                return f"{hour:02}:{minute}0"
+
+            return f"{hour:02}:{minute:02}"
+
+    return None
+
+
 def to_time(value) -> Union[str, None]:
     if not value:
         return None
@@ -63,19 +158,13 @@ def to_time(value) -> Union[str, None]:
         return f"{value.hour:02}:{value.minute:02}"
 
     if isinstance(value, str):
-        time_pattern = r"([0-9]{1,2})[\.,:;]([0-9]{1,2})"
-        matches = re.match(time_pattern, value)
-        if matches:
-            hour = int(matches.group(1))
-            minute = int(matches.group(2))
-
-            if (0 <= hour <= 23 and 0 <= minute <= 59) or (hour == 24 and minute == 00):
-                if minute < 6:
-                    return f"{hour:02}:{minute}0"
+        normalized_time = normalize_time(value)
 
-                return f"{hour:02}:{minute:02}"
+        if normalized_time is not None:
+            return normalized_time
 
-    logging.error(f"Error parsing time, value: {value}")
+    # Counted instead of logged, invalid times are common in the source data
+    parse_failure_counter.add(1, {"parser": "to_time"})
     return None
 
 
@@ -90,7 +179,7 @@ def to_datetime(value) -> Union[datetime, None]:
         return datetime(value.year, value.month, value.day)
 
     if isinstance(value, str):
-        parsed_value = parser.isoparse(value)
+        parsed_value = parse_datetime(value)
         return parsed_value
 
     logging.error(f"Error parsing datetime, value: {value}")
@@ -1,4 +1,5 @@
 import json
+from app.decosjoin_service import SELECT_FIELDS
 from app.fixtures.data import (
     get_blob_response,
     get_blob_response_no_pdf,
@@ -47,6 +48,8 @@ class MockedResponse(Response):
         self.status_code = status_code
         self.reason = reason
         self.encoding = encoding
+        self._content_consumed = True
+        self.raw = None
 
 
 def get_response_mock(self, *args, **kwargs):
@@ -95,7 +98,15 @@ def post_response_mock_unauthorized(self, *args, **kwargs):
     )
 
 
-_folder_params = "?select=title,mark,text45,subject1,bol7,bol8,bol9,bol10,bol11,bol12,bol13,bol16,bol17,bol18,bol20,bol21,bol22,bol23,bol52,company,date1,date2,date5,date6,date7,date8,dfunction,document_date,num3,num6,num14,num15,text5,text6,text7,text8,text9,text10,text11,text12,text13,text14,text15,text17,text18,text19,text20,text21,text22,text25,text39,text49,processed,sequence&top=10"
+async def get_response_mock_async(self, *args, **kwargs):
+    return get_response_mock(self, *args, **kwargs)
+
+
+async def post_response_mock_async(self, *args, **kwargs):
+    return post_response_mock(self, *args, **kwargs)
+
+
+_folder_params = f"?select={SELECT_FIELDS}&top=10"
 # For readability sake, this is a tuple which is converted into a dict
 mocked_get_urls_tuple = (
     (
@@ -7,11 +7,13 @@ from app.config import (
     get_decosjoin_username,
 )
 from app.decosjoin_service import DecosJoinConnection
+from app.decosjoin_service_async import AsyncDecosJoinConnection
 
 
 def get_connection():
     """Creates a DecosJoin connection instance if there is none yet for the
-    current application context.
+    current application context. The underlying http connection pool is shared by all
+    connection instances in the process, see decosjoin_service.get_session.
     """
     decosjoin_service = g.get("decosjoin_service", None)
     if not decosjoin_service:
@@ -23,6 +25,18 @@ def get_connection():
     return decosjoin_service
 
 
+def get_async_connection():
+    """Like get_connection but for the asyncio client, see decosjoin_service_async."""
+    decosjoin_service = g.get("decosjoin_service_async", None)
+    if not decosjoin_service:
+        decosjoin_service = g.decosjoin_service_async = AsyncDecosJoinConnection(
+            get_decosjoin_username(),
+            get_decosjoin_password(),
+            get_decosjoin_api_host(),
+        )
+    return decosjoin_service
+
+
 def success_response_json(response_content):
     return make_response({"status": "OK", "content": response_content}, 200)
 
@@ -0,0 +1,133 @@
+import concurrent.futures
+import os
+import threading
+from contextlib import contextmanager
+
+from opentelemetry import metrics
+from opentelemetry.metrics import Observation
+
+from app.config import DECOS_API_MAX_IN_FLIGHT, DECOS_API_MAX_WORKERS
+
+
+class IOScheduler:
+    """Process wide thread pool to which all (I/O bound) work for the Decos api is submitted.
+
+    Next to the number of worker threads, the number of requests to the Decos api that are in
+    flight at the same time is capped with request_slot. Work submitted from one of the worker
+    threads is executed directly to prevent the pool from waiting on itself.
+    """
+
+    def __init__(self, max_workers: int, max_in_flight: int):
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight
+
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._worker = threading.local()
+        self._in_flight_slots = threading.BoundedSemaphore(max_in_flight)
+
+        self.queued = 0
+        self.active = 0
+        self.in_flight = 0
+
+    def get_executor(self):
+        pid = os.getpid()
+
+        if self._executor is None or self._executor_pid != pid:
+            with self._lock:
+                if self._executor is None or self._executor_pid != pid:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="decosjoin-io",
+                        initializer=self._init_worker,
+                    )
+                    self._executor_pid = pid
+
+        return self._executor
+
+    def _init_worker(self):
+        self._worker.is_worker = True
+
+    def is_worker_thread(self):
+        return getattr(self._worker, "is_worker", False)
+
+    def _count(self, attr, delta):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + delta)
+
+    def submit(self, fn, *args, **kwargs) -> concurrent.futures.Future:
+        if self.is_worker_thread():
+            future = concurrent.futures.Future()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as error:
+                future.set_exception(error)
+            return future
+
+        def run():
+            self._count("queued", -1)
+            self._count("active", 1)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._count("active", -1)
+
+        self._count("queued", 1)
+        try:
+            return self.get_executor().submit(run)
+        except Exception:
+            self._count("queued", -1)
+            raise
+
+    def map(self, fn, iterable):
+        """Like Executor.map, the results are returned in the order of iterable. There is no
+        timeout: the pool is shared with other requests so time spent in the queue says nothing
+        about the task, every request to the Decos api has its own timeout instead."""
+        futures = [self.submit(fn, item) for item in iterable]
+
+        try:
+            return [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+
+    @contextmanager
+    def request_slot(self):
+        """Wait for, and hold, one of the max_in_flight slots for a request to the Decos api."""
+        with self._in_flight_slots:
+            self._count("in_flight", 1)
+            try:
+                yield
+            finally:
+                self._count("in_flight", -1)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "active": self.active,
+            "inFlight": self.in_flight,
+            "maxWorkers": self.max_workers,
+            "maxInFlight": self.max_in_flight,
+        }
+
+
+scheduler = IOScheduler(DECOS_API_MAX_WORKERS, DECOS_API_MAX_IN_FLIGHT)
+
+meter = metrics.get_meter(__name__)
+
+meter.create_observable_gauge(
+    "decosjoin.scheduler.queued",
+    callbacks=[lambda options: [Observation(scheduler.queued)]],
+    description="Number of tasks waiting for a worker thread",
+)
+meter.create_observable_gauge(
+    "decosjoin.scheduler.active",
+    callbacks=[lambda options: [Observation(scheduler.active)]],
+    description="Number of tasks being executed by a worker thread",
+)
+meter.create_observable_gauge(
+    "decosjoin.scheduler.in_flight",
+    callbacks=[lambda options: [Observation(scheduler.in_flight)]],
+    description="Number of requests to the Decos api in flight",
+)
@@ -1,8 +1,9 @@
 import logging
 import os
 
+import httpx
 from azure.monitor.opentelemetry import configure_azure_monitor
-from flask import Flask, make_response
+from flask import Flask, Response, request
 from opentelemetry import trace
 from opentelemetry.instrumentation.flask import FlaskInstrumentor
 from opentelemetry.trace import get_tracer_provider
@@ -10,12 +11,19 @@ from requests.exceptions import HTTPError
 
 from app import auth
 from app.config import (
+    DECOS_ASYNC_ENABLED,
     IS_DEV,
     UpdatedJSONProvider,
     get_application_insights_connection_string,
 )
 from app.crypto import decrypt
-from app.helpers import error_response_json, get_connection, success_response_json
+from app.decosjoin_service_async import run_async
+from app.helpers import (
+    error_response_json,
+    get_async_connection,
+    get_connection,
+    success_response_json,
+)
 
 # See also: https://medium.com/@tedisaacs/auto-instrumenting-python-fastapi-and-monitoring-with-azure-application-insights-768a59d2f4b9
 if get_application_insights_connection_string():
@@ -34,7 +42,12 @@ FlaskInstrumentor.instrument_app(app)
 def get_vergunningen():
     with tracer.start_as_current_span("/getvergunningen"):
         user = auth.get_current_user()
-        zaken = get_connection().get_zaken(user["type"], user["id"])
+        if DECOS_ASYNC_ENABLED:
+            zaken = run_async(
+                get_async_connection().get_zaken(user["type"], user["id"])
+            )
+        else:
+            zaken = get_connection().get_zaken(user["type"], user["id"])
 
         return success_response_json(zaken)
 
@@ -45,7 +58,12 @@ def get_documents(encrypted_zaak_id):
     with tracer.start_as_current_span("/listdocuments"):
         user = auth.get_current_user()
         zaak_id = decrypt(encrypted_zaak_id, user["id"])
-        documents = get_connection().get_documents(zaak_id, user["id"])
+        if DECOS_ASYNC_ENABLED:
+            documents = run_async(
+                get_async_connection().get_documents(zaak_id, user["id"])
+            )
+        else:
+            documents = get_connection().get_documents(zaak_id, user["id"])
 
         return success_response_json(documents)
 
@@ -57,10 +75,45 @@ def get_document_blob(encrypted_doc_id):
         user = auth.get_current_user()
 
         doc_id = decrypt(encrypted_doc_id, user["id"])
-        document = get_connection().get_document_blob(doc_id)
+        connection = get_connection()
+        etag = connection.get_document_etag(doc_id)
+
+        if request.if_none_match.contains_weak(etag):
+            not_modified_response = Response(status=304)
+            not_modified_response.set_etag(etag)
+            return not_modified_response
+
+        # Only forward the range if the client still has the same version of the document
+        byte_range = None
+        if request.if_range.date is None and request.if_range.etag in [None, etag]:
+            byte_range = request.headers.get("Range")
+
+        # A single upstream request, streamed by the request thread also when async is enabled
+        document = connection.get_document_blob(
+            doc_id, stream=True, byte_range=byte_range
+        )
+        file_data = document.pop("file_data")
 
-        new_response = make_response(document["file_data"])
-        new_response.headers["Content-Type"] = document["Content-Type"]
+        new_response = Response(
+            file_data,
+            status=206 if "Content-Range" in document else 200,
+            headers=document,
+            direct_passthrough=True,
+        )
+        new_response.set_etag(etag)
+
+        # Decos returned the full document, the requested range is taken from its stream
+        if new_response.status_code == 200 and "Content-Length" in document:
+            try:
+                new_response.make_conditional(
+                    request,
+                    accept_ranges=True,
+                    complete_length=int(document["Content-Length"]),
+                )
+            except Exception:
+                # E.g. a range that is not satisfiable, the upstream response is not served
+                new_response.close()
+                raise
 
         return new_response
 
@@ -92,7 +145,7 @@ def handle_error(error):
         msg_request_http_error = error_message_original
         msg_server_error = error_message_original
 
-    if isinstance(error, HTTPError):
+    if isinstance(error, (HTTPError, httpx.HTTPStatusError)):
         return error_response_json(
             msg_request_http_error,
             error.response.status_code,
@@ -0,0 +1,128 @@
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+import jwt
+from freezegun import freeze_time
+
+from app.auth import (
+    PROFILE_TYPE_PRIVATE,
+    FlaskServerTestCase,
+    JWKSKeyStore,
+    get_client_id,
+    get_user_profile_from_token,
+    get_verified_token_data,
+    verified_token_cache,
+)
+
+KID = FlaskServerTestCase.rsa_private_key_test["kid"]
+
+
+@patch.object(jwt.PyJWKClient, "fetch_data")
+class JWKSKeyStoreTests(TestCase):
+    def setUp(self):
+        self.key_store = JWKSKeyStore("http://localhost/jwks", 3600, 60)
+
+    def test_get_signing_key(self, fetch_data_mock):
+        fetch_data_mock.return_value = FlaskServerTestCase.rsa_public_key_test
+
+        signing_key = self.key_store.get_signing_key(KID)
+        self.assertEqual(signing_key.key_id, KID)
+
+        self.assertIs(self.key_store.get_signing_key(KID), signing_key)
+        self.assertEqual(fetch_data_mock.call_count, 1)
+
+    def test_get_signing_key_ttl(self, fetch_data_mock):
+        fetch_data_mock.return_value = FlaskServerTestCase.rsa_public_key_test
+        self.key_store.ttl = 0
+
+        self.key_store.get_signing_key(KID)
+        self.key_store.get_signing_key(KID)
+        self.assertEqual(fetch_data_mock.call_count, 2)
+
+    def test_get_signing_key_unknown_kid(self, fetch_data_mock):
+        fetch_data_mock.return_value = FlaskServerTestCase.rsa_public_key_test
+        self.key_store.get_signing_key(KID)
+
+        # Forces a refresh once per cooldown
+        for _ in range(3):
+            with self.assertRaises(jwt.PyJWKClientError):
+                self.key_store.get_signing_key("unknown")
+
+        self.assertEqual(fetch_data_mock.call_count, 1)
+
+        self.key_store.refresh_cooldown = 0
+
+        with self.assertRaises(jwt.PyJWKClientError):
+            self.key_store.get_signing_key("unknown")
+
+        self.assertEqual(fetch_data_mock.call_count, 2)
+
+    def test_get_signing_key_refresh_error(self, fetch_data_mock):
+        fetch_data_mock.return_value = FlaskServerTestCase.rsa_public_key_test
+        signing_key = self.key_store.get_signing_key(KID)
+
+        fetch_data_mock.side_effect = jwt.PyJWKClientConnectionError("Unavailable")
+        self.key_store.ttl = 0
+
+        self.assertIs(self.key_store.get_signing_key(KID), signing_key)
+
+    def test_get_signing_key_unavailable(self, fetch_data_mock):
+        fetch_data_mock.side_effect = jwt.PyJWKClientConnectionError("Unavailable")
+
+        with self.assertRaises(jwt.PyJWKClientConnectionError):
+            self.key_store.get_signing_key(KID)
+
+    def test_get_verified_token_data(self, fetch_data_mock):
+        fetch_data_mock.return_value = FlaskServerTestCase.rsa_public_key_test
+
+        token = FlaskServerTestCase().get_token_header_value(PROFILE_TYPE_PRIVATE)
+        token = token.replace("Bearer ", "")
+
+        with patch("app.auth.jwks_key_store", self.key_store):
+            token_data = get_verified_token_data(token)
+
+        self.assertEqual(token_data["sub"], FlaskServerTestCase.TEST_BSN)
+
+
+@patch("app.auth.VERIFY_JWT_SIGNATURE", True)
+class VerifiedTokenCacheTests(TestCase):
+    def setUp(self):
+        verified_token_cache.clear()
+
+    def get_token(self, **claims):
+        token_data = {"aud": get_client_id(PROFILE_TYPE_PRIVATE), "sub": "111222333"}
+        token_data.update(claims)
+
+        key = jwt.api_jwk.PyJWK.from_dict(
+            FlaskServerTestCase.rsa_private_key_test, algorithm="RS256"
+        ).key
+        return jwt.encode(token_data, key, algorithm="RS256", headers={"kid": KID})
+
+    @patch("app.auth.get_verified_token_data", wraps=get_verified_token_data)
+    @patch.object(jwt.PyJWKClient, "fetch_data")
+    def test_cached(self, fetch_data_mock, verify_mock):
+        fetch_data_mock.return_value = FlaskServerTestCase.rsa_public_key_test
+        token = self.get_token(exp=int(time.time()) + 60)
+
+        profile = get_user_profile_from_token(token)
+        self.assertEqual(profile, {"id": "111222333", "type": PROFILE_TYPE_PRIVATE})
+
+        self.assertEqual(get_user_profile_from_token(token), profile)
+        self.assertEqual(verify_mock.call_count, 1)
+
+    @patch("app.auth.get_verified_token_data", wraps=get_verified_token_data)
+    @patch.object(jwt.PyJWKClient, "fetch_data")
+    def test_expires_with_token(self, fetch_data_mock, verify_mock):
+        fetch_data_mock.return_value = FlaskServerTestCase.rsa_public_key_test
+
+        with freeze_time("2024-01-01 12:00:00") as frozen_time:
+            token = self.get_token(exp=int(time.time()) + 60)
+            get_user_profile_from_token(token)
+
+            frozen_time.tick(61)
+
+            with self.assertRaises(jwt.ExpiredSignatureError):
+                get_user_profile_from_token(token)
+
+        self.assertEqual(verify_mock.call_count, 2)
@@ -0,0 +1,145 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from app.blob_cache import BlobCache, CorruptBlobError
+from app.decosjoin_service import DecosJoinConnection
+from app.fixtures.data import get_document_blob
+from app.fixtures.response_mock import get_response_mock
+
+TESTKEY = "z4QXWk3bjwFST2HRRVidnn7Se8VFCaHscK39JfODzNs="
+
+
+@patch("app.blob_cache.get_encrytion_key", lambda: TESTKEY)
+class BlobCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.blob_cache = BlobCache(self.directory.name, 1000, 500)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def cached_files(self):
+        return sorted(os.listdir(self.directory.name))
+
+    def test_put_get(self):
+        self.assertIsNone(self.blob_cache.get("DOC1"))
+
+        self.blob_cache.put("DOC1", {"Content-Type": "application/pdf"}, b"pdf data")
+
+        document = self.blob_cache.get("DOC1")
+        self.assertEqual(document["Content-Type"], "application/pdf")
+        self.assertEqual(b"".join(document["file_data"]), b"pdf data")
+
+    def test_encrypted(self):
+        self.blob_cache.put("DOC1", {"Content-Type": "application/pdf"}, b"pdf data")
+
+        [name] = self.cached_files()
+        self.assertNotIn("DOC1", name)
+
+        with open(os.path.join(self.directory.name, name), "rb") as blob_file:
+            content = blob_file.read()
+
+        self.assertNotIn(b"pdf data", content)
+        self.assertNotIn(b"application/pdf", content)
+
+    def test_tee(self):
+        chunks = self.blob_cache.tee("DOC1", {"Content-Length": "6"}, [b"abc", b"def"])
+
+        self.assertIsNone(self.blob_cache.get("DOC1"))
+        self.assertEqual(list(chunks), [b"abc", b"def"])
+
+        document = self.blob_cache.get("DOC1")
+        self.assertEqual(list(document["file_data"]), [b"abc", b"def"])
+
+    def test_tee_not_consumed(self):
+        chunks = self.blob_cache.tee("DOC1", {}, [b"abc", b"def"])
+        next(chunks)
+        chunks.close()
+
+        self.assertIsNone(self.blob_cache.get("DOC1"))
+        self.assertEqual(self.cached_files(), [])
+
+    def test_content_length_mismatch(self):
+        list(self.blob_cache.tee("DOC1", {"Content-Length": "10"}, [b"abc"]))
+        self.assertIsNone(self.blob_cache.get("DOC1"))
+
+    def test_max_item_bytes(self):
+        self.blob_cache.put("DOC1", {}, b"x" * 501)
+        self.assertIsNone(self.blob_cache.get("DOC1"))
+        self.assertEqual(self.cached_files(), [])
+
+    def test_evict_least_recently_used(self):
+        self.blob_cache.put("DOC1", {}, b"x" * 400)
+        self.blob_cache.put("DOC2", {}, b"x" * 400)
+
+        # Make DOC2 the least recently used
+        name2 = self.blob_cache.get_name("DOC2", self.blob_cache.get_keys()[1])
+        old_time = time.time() - 10
+        os.utime(os.path.join(self.directory.name, name2), (old_time, old_time))
+        self.blob_cache.get("DOC1")
+
+        self.blob_cache.put("DOC3", {}, b"x" * 400)
+
+        self.assertIsNotNone(self.blob_cache.get("DOC1"))
+        self.assertIsNone(self.blob_cache.get("DOC2"))
+        self.assertIsNotNone(self.blob_cache.get("DOC3"))
+
+    def test_corrupt(self):
+        self.blob_cache.put("DOC1", {}, b"pdf data")
+
+        [name] = self.cached_files()
+        path = os.path.join(self.directory.name, name)
+
+        with open(path, "r+b") as blob_file:
+            blob_file.seek(-1, os.SEEK_END)
+            blob_file.write(b"\x00")
+
+        document = self.blob_cache.get("DOC1")
+
+        with self.assertRaises(CorruptBlobError):
+            list(document["file_data"])
+
+        self.assertEqual(self.cached_files(), [])
+
+    def test_corrupt_headers(self):
+        self.blob_cache.put("DOC1", {}, b"pdf data")
+
+        [name] = self.cached_files()
+
+        with open(os.path.join(self.directory.name, name), "r+b") as blob_file:
+            blob_file.write(b"\x00")
+
+        self.assertIsNone(self.blob_cache.get("DOC1"))
+        self.assertEqual(self.cached_files(), [])
+
+    def test_other_key(self):
+        self.blob_cache.put("DOC1", {}, b"pdf data")
+
+        with patch(
+            "app.blob_cache.get_encrytion_key",
+            lambda: "rCZ8yQ0Sdc4WGVG2nSdtWqcwqN7E1Z4wX0QJWYb7Vt0=",
+        ):
+            self.assertIsNone(self.blob_cache.get("DOC1"))
+
+    @patch("app.decosjoin_service.DecosJoinConnection.get_response")
+    def test_get_document_blob_cached(self, get_response):
+        get_response.side_effect = lambda *args, **kwargs: get_response_mock(
+            None, *args, **kwargs
+        )
+        connection = DecosJoinConnection(
+            "username", "password", "http://localhost", {"bsn": []}
+        )
+        blob_cache = BlobCache(self.directory.name, 100000, 50000)
+
+        with patch("app.decosjoin_service.get_blob_cache", lambda: blob_cache):
+            document = connection.get_document_blob("DOCUMENTKEY01", stream=True)
+            self.assertEqual(b"".join(document["file_data"]), get_document_blob())
+
+            document = connection.get_document_blob("DOCUMENTKEY01")
+            self.assertEqual(document["file_data"], get_document_blob())
+            self.assertEqual(document["Content-Type"], "application/pdf")
+
+        self.assertEqual(get_response.call_count, 1)
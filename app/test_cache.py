@@ -0,0 +1,55 @@
+from unittest import TestCase
+
+from freezegun import freeze_time
+
+from app.cache import NOT_FOUND, TTLCache, hash_key
+
+
+class TTLCacheTests(TestCase):
+    def test_get_set(self):
+        cache = TTLCache(2, 60)
+        self.assertIs(cache.get("a"), NOT_FOUND)
+        self.assertIsNone(cache.get("a", None))
+
+        cache.set("a", None)
+        self.assertIsNone(cache.get("a"))
+
+        cache.delete("a")
+        self.assertIs(cache.get("a"), NOT_FOUND)
+
+    def test_ttl(self):
+        cache = TTLCache(10, 60)
+
+        with freeze_time("2024-01-01 12:00:00") as frozen_time:
+            cache.set("a", 1)
+            cache.set("b", 2, ttl=120)
+
+            frozen_time.tick(61)
+            self.assertIs(cache.get("a"), NOT_FOUND)
+            self.assertEqual(cache.get("b"), 2)
+
+            frozen_time.tick(60)
+            self.assertIs(cache.get("b"), NOT_FOUND)
+
+    def test_lru_eviction(self):
+        cache = TTLCache(2, 60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIs(cache.get("b"), NOT_FOUND)
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_disabled(self):
+        cache = TTLCache(10, 0)
+        cache.set("a", 1)
+        self.assertIs(cache.get("a"), NOT_FOUND)
+
+    def test_hash_key(self):
+        key = hash_key("private", "111222333")
+        self.assertEqual(key, hash_key("private", "111222333"))
+        self.assertNotEqual(key, hash_key("commercial", "111222333"))
+        self.assertNotIn(b"111222333", key)
@@ -1,9 +1,19 @@
+import os
 from unittest.case import TestCase
 from unittest.mock import patch
 
 from cryptography.fernet import InvalidToken
+from freezegun import freeze_time
 
-from app.crypto import encrypt, decrypt
+from app.config import get_encrytion_keys_secondary
+from app.crypto import (
+    decrypt,
+    decrypt_cache,
+    encrypt,
+    encrypt_many,
+    get_fernet,
+    get_multi_fernet,
+)
 
 
 @patch(
@@ -11,6 +21,9 @@ from app.crypto import encrypt, decrypt
     lambda: "z4QXWk3bjwFST2HRRVidnn7Se8VFCaHscK39JfODzNs=",
 )
 class CryptoTest(TestCase):
+    def setUp(self):
+        decrypt_cache.clear()
+
     def test_encrypt_decrypt(self):
         value = "abcdefg"
         enc = encrypt(value)
@@ -44,3 +57,57 @@ class CryptoTest(TestCase):
         enc = encrypt(value)
         with self.assertRaises(InvalidToken):
             self.assertEqual(decrypt(enc, bsn), value)
+
+    def test_encrypt_many(self):
+        items = [("abcdefg", "12345678"), ("hijklmn", "87654321")]
+        encrypted = encrypt_many(items)
+
+        self.assertEqual(len(encrypted), 2)
+        self.assertEqual(decrypt(encrypted[0], "12345678"), "abcdefg")
+        self.assertEqual(decrypt(encrypted[1], "87654321"), "hijklmn")
+
+    def test_get_fernet_cached(self):
+        key = "z4QXWk3bjwFST2HRRVidnn7Se8VFCaHscK39JfODzNs="
+        self.assertIs(get_fernet(key), get_fernet(key))
+
+    def test_decrypt_secondary_key(self):
+        secondary_key = "rCZ8yQ0Sdc4WGVG2nSdtWqcwqN7E1Z4wX0QJWYb7Vt0="
+
+        with patch("app.crypto.get_encrytion_key", lambda: secondary_key):
+            enc = encrypt("abcdefg", "12345678")
+
+        with self.assertRaises(InvalidToken):
+            decrypt(enc, "12345678")
+
+        with patch("app.crypto.get_encrytion_keys_secondary", lambda: [secondary_key]):
+            self.assertEqual(decrypt(enc, "12345678"), "abcdefg")
+            self.assertEqual(decrypt(encrypt("hijklmn")), "hijklmn")
+
+    @patch.dict(
+        os.environ,
+        {"FERNET_ENCRYPTION_KEYS_SECONDARY": " key1, key2,"},
+    )
+    def test_get_encrytion_keys_secondary(self):
+        self.assertEqual(get_encrytion_keys_secondary(), ["key1", "key2"])
+
+    def test_decrypt_cached(self):
+        enc = encrypt("abcdefg", "12345678")
+
+        with patch("app.crypto.get_multi_fernet", wraps=get_multi_fernet) as mock:
+            self.assertEqual(decrypt(enc, "12345678"), "abcdefg")
+            self.assertEqual(decrypt(enc, "12345678"), "abcdefg")
+            self.assertEqual(mock.call_count, 1)
+
+            with self.assertRaises(InvalidToken):
+                decrypt(enc, "2345")
+
+    def test_decrypt_cached_expired(self):
+        with freeze_time("2021-07-05 12:00:00") as frozen_time:
+            enc = encrypt("abcdefg", "12345678")
+
+            frozen_time.tick(60 * 30)
+            self.assertEqual(decrypt(enc, "12345678"), "abcdefg")
+
+            frozen_time.tick(60 * 30 + 1)
+            with self.assertRaises(InvalidToken):
+                decrypt(enc, "12345678")
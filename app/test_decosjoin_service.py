@@ -1,11 +1,20 @@
+import threading
 from pprint import pprint
 from unittest import TestCase
 from unittest.mock import patch
 
 from freezegun import freeze_time
 
-from app.decosjoin_service import DecosJoinConnection
+from app.config import DECOS_API_REQUEST_TIMEOUT
+from app.decosjoin_service import (
+    SELECT_FIELDS,
+    DecosJoinConnection,
+    get_session,
+    user_keys_cache,
+    workflow_date_cache,
+)
 from app.field_parsers import to_date
+from app.scheduler import scheduler
 from app.fixtures.response_mock import get_response_mock, post_response_mock
 from app.zaaktypes import BBVergunning
 
@@ -22,6 +31,9 @@ from app.zaaktypes import BBVergunning
 @freeze_time("2021-07-05")
 class ConnectionTests(TestCase):
     def setUp(self) -> None:
+        user_keys_cache.clear()
+        workflow_date_cache.clear()
+
         self.connection = DecosJoinConnection(
             "username",
             "password",
@@ -45,6 +57,25 @@ class ConnectionTests(TestCase):
             ],
         )
 
+    def test_get_user_key_cached(self):
+        with patch.object(
+            self.connection, "post_response", wraps=self.connection.post_response
+        ) as post_response_mock:
+            user_keys = self.connection.get_user_keys("bsn", "111222333")
+            self.assertEqual(post_response_mock.call_count, 2)
+
+            self.assertEqual(
+                self.connection.get_user_keys("bsn", "111222333"), user_keys
+            )
+            self.assertEqual(post_response_mock.call_count, 2)
+
+            self.connection.invalidate_user_keys("bsn", "111222333")
+
+            self.assertEqual(
+                self.connection.get_user_keys("bsn", "111222333"), user_keys
+            )
+            self.assertEqual(post_response_mock.call_count, 4)
+
     def assert_unknown_identifier(self, zaken, identifier):
         self.assertEqual(
             [zaak["identifier"] for zaak in zaken if zaak["identifier"] == identifier],
@@ -122,6 +153,20 @@ class ConnectionTests(TestCase):
         # Z/20/2345678.1 is filtered out because of decision "Geannuleerd"
         self.assert_unknown_identifier(zaken, "Z/20/2345678.1")
 
+    @patch("app.decosjoin_service.PAGE_SIZE", 10)
+    def test_get_zaken_busy_scheduler(self):
+        # The workers are busy with the work of other requests for longer than the timeout of a
+        # request to the Decos api, the zaken are still returned once the workers are free.
+        event = threading.Event()
+        busy = [scheduler.submit(event.wait, 1) for _ in range(scheduler.max_workers)]
+        threading.Timer(0.3, event.set).start()
+
+        with patch("app.decosjoin_service.DECOS_API_REQUEST_TIMEOUT", 0.1):
+            zaken = self.connection.get_zaken("bsn", "111222333")
+
+        self.assertEqual(len(zaken), 17)
+        self.assertTrue(all(future.result() for future in busy))
+
     @patch("app.decosjoin_service.PAGE_SIZE", 10)
     def test_get_documents(self):
         documents = self.connection.get_documents("ZAAKKEY1", "111222333")
@@ -131,6 +176,27 @@ class ConnectionTests(TestCase):
         self.assertEqual(doc0["id"], "D/2")
         self.assertTrue(doc0["url"].startswith("/decosjoin/document/"))
 
+    @patch("app.decosjoin_service.PAGE_SIZE", 10)
+    def test_get_documents_data_concurrently(self):
+        with patch(
+            "app.decosjoin_service.scheduler.map", wraps=scheduler.map
+        ) as map_mock:
+            documents = self.connection.get_documents("ZAAKKEY1", "111222333")
+
+        map_mock.assert_called_once()
+        self.assertEqual([document["id"] for document in documents], ["D/2", "D/6"])
+
+    def test_get_document_blob_timeout(self):
+        with patch.object(
+            self.connection, "get_response", wraps=self.connection.get_response
+        ) as get_response_mock:
+            document = self.connection.get_document_blob("DOCUMENTKEY01", stream=True)
+            document["file_data"].close()
+
+        self.assertEqual(
+            get_response_mock.call_args.kwargs["timeout"], DECOS_API_REQUEST_TIMEOUT
+        )
+
     def test_transform_bb_vergunning(self):
         def wrap(zaak, key):
             return {
@@ -174,6 +240,55 @@ class ConnectionTests(TestCase):
         self.assertEqual(zaken_result[0]["identifier"], "Z/21/78901234")
         self.assertEqual(zaken_result[0]["dateWorkflowActive"], to_date("2021-09-15"))
 
+    def test_transform_zaak_source_not_mutated(self):
+        fields = {
+            "document_date": "2021-05-19T00:00:00",
+            "mark": "Z/21/78901234",
+            "text45": "Flyeren-Sampling",
+            "title": "Ontvangen",
+        }
+        zaak_source = {"key": "HEXSTRING18", "fields": fields}
+
+        [zaak, Zaak] = self.connection.transform_zaak(zaak_source, "test-user-id")
+
+        self.assertEqual(zaak["id"], "HEXSTRING18")
+        self.assertNotIn("id", fields)
+
+    def test_transform_zaak_unknown_type(self):
+        zaak_source = {"key": "HEXSTRING19", "fields": {"text45": "Onbekend"}}
+
+        self.assertIsNone(self.connection.transform_zaak(zaak_source, "user-id"))
+        self.assertIsNone(self.connection.transform_zaak({"fields": {}}, "user-id"))
+
+    @patch("app.decosjoin_service.PAGE_SIZE", 10)
+    def test_get_all_pages(self):
+        url = f"http://localhost/decosweb/aspx/api/v1/items/32charsstringxxxxxxxxxxxxxxxxxx2/folders?select={SELECT_FIELDS}"
+
+        items_parallel = self.connection.get_all_pages(url)
+        items_sequential = self.connection.get_all_pages(url, parallel=False)
+
+        self.assertEqual(len(items_parallel), 23)
+        self.assertEqual(
+            [item["key"] for item in items_parallel],
+            [item["key"] for item in items_sequential],
+        )
+
+    @patch("app.decosjoin_service.PAGE_SIZE", 10)
+    def test_iter_all_pages(self):
+        url = f"http://localhost/decosweb/aspx/api/v1/items/32charsstringxxxxxxxxxxxxxxxxxx2/folders?select={SELECT_FIELDS}"
+
+        with patch.object(
+            self.connection, "get_page", wraps=self.connection.get_page
+        ) as get_page_mock:
+            items = self.connection.iter_all_pages(url, parallel=False)
+            self.assertEqual(get_page_mock.call_count, 0)
+
+            next(items)
+            self.assertEqual(get_page_mock.call_count, 1)
+
+            self.assertEqual(len(list(items)), 22)
+            self.assertEqual(get_page_mock.call_count, 3)
+
     def test_get_workflow(self):
         workflow_date = self.connection.get_workflow_date_by_step_title(
             "HEXSTRING17", BBVergunning.date_workflow_active_step_title
@@ -181,7 +296,98 @@ class ConnectionTests(TestCase):
 
         self.assertEqual(workflow_date, to_date("2021-09-15"))
 
+    def test_get_workflow_cached(self):
+        with patch.object(
+            self.connection, "get_response", wraps=self.connection.get_response
+        ) as get_response_mock:
+            for _ in range(2):
+                workflow_date = self.connection.get_workflow_date_by_step_title(
+                    "HEXSTRING17", BBVergunning.date_workflow_active_step_title
+                )
+                self.assertEqual(workflow_date, to_date("2021-09-15"))
+
+            self.assertEqual(get_response_mock.call_count, 2)
+
+    def test_get_workflow_dates(self):
+        with patch.object(
+            self.connection, "get_response", wraps=self.connection.get_response
+        ) as get_response_mock:
+            workflow_dates = self.connection.get_workflow_dates_by_step_titles(
+                "HEXSTRING17", [BBVergunning.date_workflow_active_step_title]
+            )
+            self.assertEqual(
+                workflow_dates,
+                {BBVergunning.date_workflow_active_step_title: to_date("2021-09-15")},
+            )
+            self.assertEqual(get_response_mock.call_count, 2)
+
+    def test_fetch_workflow_dates_multiple_steps(self):
+        workflow_url = "http://localhost/decosweb/aspx/api/v1/items/HEXSTRING_ALL_WORKFLOWS_RESPONSE/workflowlinkinstances?properties=false&fetchParents=false&select=mark,date1,date2,text7,sequence&orderBy=sequence&filter=text7 eq 'Step A' or text7 eq 'Step B'"
+        responses = {
+            "http://localhost/decosweb/aspx/api/v1/items/HEXSTRING17/workflows": {
+                "count": 1,
+                "content": [{"key": "HEXSTRING_ALL_WORKFLOWS_RESPONSE"}],
+            },
+            workflow_url: {
+                "count": 2,
+                "content": [
+                    {"fields": {"text7": "Step A", "date1": "2021-09-15T00:00:00"}},
+                    {"fields": {"text7": "Step C", "date1": "2021-09-16T00:00:00"}},
+                ],
+            },
+        }
+
+        with patch.object(
+            self.connection, "request", side_effect=responses.get
+        ) as request_mock:
+            workflow_dates = self.connection.get_workflow_dates_by_step_titles(
+                "HEXSTRING17", ["Step A", "Step B"]
+            )
+
+        self.assertEqual(
+            workflow_dates, {"Step A": to_date("2021-09-15"), "Step B": None}
+        )
+        self.assertEqual(request_mock.call_count, 2)
+
+    @patch("app.decosjoin_service.DECOS_WORKFLOW_DATE_CACHE_MISS_TTL", 60)
+    def test_get_workflow_cached_miss(self):
+        with patch.object(
+            self.connection, "fetch_workflow_dates_by_step_titles", return_value={}
+        ) as fetch_mock:
+            with freeze_time("2021-07-05 12:00:00") as frozen_time:
+                for _ in range(2):
+                    self.assertIsNone(
+                        self.connection.get_workflow_date_by_step_title(
+                            "HEXSTRING17", "Unknown step"
+                        )
+                    )
+                self.assertEqual(fetch_mock.call_count, 1)
+
+                frozen_time.tick(61)
+                self.connection.get_workflow_date_by_step_title(
+                    "HEXSTRING17", "Unknown step"
+                )
+                self.assertEqual(fetch_mock.call_count, 2)
+
     # def test_get_document_blob(self):
     #     documents = self.connection.get_document_blob('DOCUMENTKEY01')
     #     self.assertEqual(documents['Content-Type'], "application/pdf")
     #     self.assertEqual(documents['file_data'], get_document_blob())
+
+
+class SessionTests(TestCase):
+    def test_get_session(self):
+        session = get_session()
+        self.assertIs(session, get_session())
+
+        adapter = session.get_adapter("https://decos.example.com")
+        self.assertEqual(adapter._pool_maxsize, 20)
+        self.assertFalse(adapter._pool_block)
+
+    @patch("app.decosjoin_service.os.getpid", lambda: -1)
+    def test_get_session_after_fork(self):
+        session = get_session()
+        self.assertIs(session, get_session())
+
+        with patch("app.decosjoin_service.os.getpid", lambda: -2):
+            self.assertIsNot(session, get_session())
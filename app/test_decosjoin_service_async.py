@@ -0,0 +1,179 @@
+import inspect
+from unittest import TestCase
+from unittest.mock import patch
+
+from freezegun import freeze_time
+
+from app.decosjoin_service import (
+    SELECT_FIELDS,
+    DecosJoinConnection,
+    DecosJoinConnectionBase,
+    user_keys_cache,
+    workflow_date_cache,
+)
+from app.decosjoin_service_async import (
+    AsyncDecosJoinConnection,
+    get_async_client,
+    run_async,
+)
+from app.field_parsers import to_date
+from app.fixtures.response_mock import (
+    get_response_mock,
+    get_response_mock_async,
+    post_response_mock,
+    post_response_mock_async,
+)
+from app.zaaktypes import BBVergunning
+
+
+@patch(
+    "app.crypto.get_encrytion_key",
+    lambda: "z4QXWk3bjwFST2HRRVidnn7Se8VFCaHscK39JfODzNs=",
+)
+@patch(
+    "app.decosjoin_service.DecosJoinConnection.get_response",
+    get_response_mock,
+)
+@patch(
+    "app.decosjoin_service.DecosJoinConnection.post_response",
+    post_response_mock,
+)
+@patch(
+    "app.decosjoin_service_async.AsyncDecosJoinConnection.get_response",
+    get_response_mock_async,
+)
+@patch(
+    "app.decosjoin_service_async.AsyncDecosJoinConnection.post_response",
+    post_response_mock_async,
+)
+@freeze_time("2021-07-05")
+class AsyncConnectionTests(TestCase):
+    def setUp(self) -> None:
+        user_keys_cache.clear()
+        workflow_date_cache.clear()
+
+        args = [
+            "username",
+            "password",
+            "http://localhost",
+            {
+                "bsn": [
+                    "hexkey32chars000000000000000BSN1",
+                    "hexkey32chars000000000000000BSN2",
+                ]
+            },
+        ]
+
+        self.connection = AsyncDecosJoinConnection(*args)
+        self.sync_connection = DecosJoinConnection(*args)
+
+    def test_get_user_key(self):
+        user_key = run_async(self.connection.get_user_keys("bsn", "111222333"))
+        self.assertEqual(
+            user_key,
+            [
+                "32charsstringxxxxxxxxxxxxxxxxxxx",
+                "32charsstringxxxxxxxxxxxxxxxxxx2",
+                "32charsstringxxxxxxxxxxxxxxxxxx3",
+            ],
+        )
+
+    @patch("app.decosjoin_service.PAGE_SIZE", 10)
+    def test_get_zaken(self):
+        zaken = run_async(self.connection.get_zaken("bsn", "111222333"))
+
+        self.assertEqual(len(zaken), 17)
+        self.assertEqual(zaken[8].get("identifier"), "Z/21/123123123")
+
+        user_keys_cache.clear()
+        workflow_date_cache.clear()
+
+        # documentsUrl contains a time based token
+        def without_documents_url(zaken):
+            return [
+                {key: value for key, value in zaak.items() if key != "documentsUrl"}
+                for zaak in zaken
+            ]
+
+        self.assertEqual(
+            without_documents_url(zaken),
+            without_documents_url(self.sync_connection.get_zaken("bsn", "111222333")),
+        )
+
+    @patch("app.decosjoin_service.PAGE_SIZE", 10)
+    def test_get_all_pages(self):
+        url = f"http://localhost/decosweb/aspx/api/v1/items/32charsstringxxxxxxxxxxxxxxxxxx2/folders?select={SELECT_FIELDS}"
+
+        items = run_async(self.connection.get_all_pages(url))
+
+        self.assertEqual(
+            [item["key"] for item in items],
+            [item["key"] for item in self.sync_connection.get_all_pages(url)],
+        )
+        self.assertEqual(len(items), 23)
+
+    @patch("app.decosjoin_service.PAGE_SIZE", 10)
+    def test_get_documents(self):
+        documents = run_async(self.connection.get_documents("ZAAKKEY1", "111222333"))
+        self.assertEqual(len(documents), 2)
+
+        doc0 = documents[0]
+        self.assertEqual(doc0["id"], "D/2")
+        self.assertTrue(doc0["url"].startswith("/decosjoin/document/"))
+
+    def test_no_sync_io_methods(self):
+        # The I/O of the sync client is not inherited, the async client only has coroutines
+        # (and async generators)
+        for name in vars(DecosJoinConnection):
+            if name.startswith("_") or hasattr(DecosJoinConnectionBase, name):
+                continue
+
+            method = getattr(AsyncDecosJoinConnection, name, None)
+
+            if method is not None:
+                self.assertTrue(
+                    inspect.iscoroutinefunction(method)
+                    or inspect.isasyncgenfunction(method),
+                    name,
+                )
+
+        self.assertFalse(hasattr(AsyncDecosJoinConnection, "get_document_blob"))
+
+    def test_get_workflow_dates(self):
+        workflow_dates = run_async(
+            self.connection.get_workflow_dates_by_step_titles(
+                "HEXSTRING17", [BBVergunning.date_workflow_active_step_title]
+            )
+        )
+        self.assertEqual(
+            workflow_dates,
+            {BBVergunning.date_workflow_active_step_title: to_date("2021-09-15")},
+        )
+
+
+class AsyncClientTests(TestCase):
+    @patch("app.decosjoin_service_async._client", None)
+    @patch(
+        "app.decosjoin_service_async.get_requests_ca_bundle",
+        lambda: "/etc/ssl/certs/ca-certificates.crt",
+    )
+    @patch("app.decosjoin_service_async.ssl.create_default_context")
+    @patch("app.decosjoin_service_async.httpx.AsyncClient")
+    def test_ca_bundle(self, async_client, create_default_context):
+        get_async_client()
+
+        create_default_context.assert_called_once_with(
+            cafile="/etc/ssl/certs/ca-certificates.crt"
+        )
+        self.assertIs(
+            async_client.call_args.kwargs["verify"],
+            create_default_context.return_value,
+        )
+
+    @patch("app.decosjoin_service_async._client", None)
+    @patch("app.decosjoin_service_async.get_requests_ca_bundle", lambda: None)
+    @patch("app.decosjoin_service_async.httpx.AsyncClient")
+    def test_no_ca_bundle(self, async_client):
+        get_async_client()
+
+        self.assertIs(async_client.call_args.kwargs["verify"], True)
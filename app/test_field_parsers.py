@@ -1,8 +1,18 @@
 from datetime import date, datetime, time
 from unittest.case import TestCase
+from unittest.mock import patch
+
+from dateutil import parser
 
 from app.field_parsers import (
+    TIME_PATTERN,
+    compile_parse_fields,
+    compile_translations,
+    get_compiled_fields,
+    get_fields,
     get_translation,
+    match_time,
+    parse_datetime,
     to_date,
     to_datetime,
     to_int,
@@ -14,6 +24,29 @@ from app.field_parsers import (
 
 
 class ValueParserTests(TestCase):
+    def test_get_compiled_fields(self):
+        parse_fields = [
+            {"name": "dateStart", "from": "date6", "parser": to_date},
+            {"name": "kenteken", "from": "text9", "parser": to_string},
+            {"name": "number", "from": "num3", "parser": to_int},
+        ]
+        zaak_source = {"date6": "2021-05-19T00:00:00", "text9": " AB-12-CD "}
+
+        parse_plan = compile_parse_fields(parse_fields)
+
+        self.assertEqual(
+            parse_plan,
+            (
+                ("dateStart", "date6", to_date),
+                ("kenteken", "text9", to_string),
+                ("number", "num3", to_int),
+            ),
+        )
+        self.assertEqual(
+            get_compiled_fields(parse_plan, zaak_source),
+            get_fields(parse_fields, zaak_source),
+        )
+
     def test_to_string(self):
         self.assertEqual(to_string("     test    "), "test")
         self.assertEqual(to_string("test"), "test")
@@ -58,6 +91,25 @@ class TranslationParserTests(TestCase):
         self.assertIsNone(get_translation("d", translations))
         self.assertIsNone(get_translation("Nope", translations))
 
+    def test_get_translations_compiled(self):
+        translations = [
+            ["a", "1Aa", True],
+            ["b", "2Aa", False],
+            ["C", "3Aa", True],
+            ["D", "4Aa", False],
+            ["A", "5Aa"],
+        ]
+        compiled = compile_translations(translations)
+
+        self.assertEqual(compiled, {"a": "1Aa", "b": None, "c": "3Aa", "d": None})
+
+        for value in ["a", "A", "b", "c", "d", "Nope"]:
+            for fallback in [True, False]:
+                self.assertEqual(
+                    get_translation(value, compiled, fallback),
+                    get_translation(value, translations, fallback),
+                )
+
     def test_get_translation(self):
         translations = [["foo", "bar"]]
         self.assertEqual(
@@ -101,6 +153,51 @@ class DateParserTests(TestCase):
         self.assertIsNone(to_time("089:0"))
         self.assertIsNone(to_time(1))
 
+    def test_to_time_matches_pattern(self):
+        for value in [
+            "14:30",
+            "4:30",
+            "12:05",
+            "12:345",
+            "123:45",
+            "1:2:3",
+            "14:3x",
+            "x4:30",
+            "٤:30",
+            "14 30",
+            "14:30 uur",
+        ]:
+            matches = TIME_PATTERN.match(value)
+            self.assertEqual(
+                match_time(value),
+                (matches.group(1), matches.group(2)) if matches else None,
+                value,
+            )
+
+    @patch("app.field_parsers.parse_failure_counter")
+    def test_to_time_failure_counted(self, parse_failure_counter_mock):
+        self.assertIsNone(to_time("not parsable"))
+        self.assertIsNone(to_time("not parsable"))
+        self.assertEqual(to_time("14:30"), "14:30")
+
+        self.assertEqual(parse_failure_counter_mock.add.call_count, 2)
+        parse_failure_counter_mock.add.assert_called_with(1, {"parser": "to_time"})
+
+    def test_parse_datetime(self):
+        for value in [
+            "2020-06-16T01:01:01",
+            "2020-06-16",
+            "20200616T010101",
+            "2020-06-16T01:01:01Z",
+            "2020-06-16T01:01:01+02:00",
+            "2020-06",
+            "2020-W25-2",
+        ]:
+            self.assertEqual(parse_datetime(value), parser.isoparse(value))
+
+        with self.assertRaises(ValueError):
+            parse_datetime("not a date")
+
     def test_to_datetime(self):
         self.assertEqual(
             to_datetime("2020-06-16T01:01:01"), datetime(2020, 6, 16, 1, 1, 1)
@@ -0,0 +1,58 @@
+import threading
+from unittest import TestCase
+
+from app.scheduler import IOScheduler
+
+
+class IOSchedulerTests(TestCase):
+    def setUp(self):
+        self.scheduler = IOScheduler(max_workers=2, max_in_flight=1)
+
+    def test_map(self):
+        results = self.scheduler.map(lambda value: value * 2, [1, 2, 3])
+        self.assertEqual(results, [2, 4, 6])
+
+    def test_map_exception(self):
+        def fail(value):
+            raise ValueError(value)
+
+        with self.assertRaises(ValueError):
+            self.scheduler.map(fail, [1])
+
+    def test_map_busy_pool(self):
+        # Tasks of other requests keep all workers busy for longer than a request timeout
+        event = threading.Event()
+        busy = [self.scheduler.submit(event.wait, 1) for _ in range(2)]
+
+        threading.Timer(0.1, event.set).start()
+
+        self.assertEqual(self.scheduler.map(lambda value: value * 2, [1, 2]), [2, 4])
+        self.assertTrue(all(future.result() for future in busy))
+
+    def test_submit_from_worker(self):
+        # With all workers busy waiting for nested work, the nested work must not be queued.
+        def outer(value):
+            return self.scheduler.submit(lambda: value + 1).result(timeout=1)
+
+        self.assertEqual(self.scheduler.map(outer, [1, 2, 3, 4]), [2, 3, 4, 5])
+
+    def test_request_slot(self):
+        with self.scheduler.request_slot():
+            self.assertEqual(self.scheduler.stats()["inFlight"], 1)
+
+            acquired = self.scheduler.map(
+                lambda value: self.scheduler._in_flight_slots.acquire(timeout=0.01),
+                [1],
+            )
+            self.assertEqual(acquired, [False])
+
+        self.assertEqual(
+            self.scheduler.stats(),
+            {
+                "queued": 0,
+                "active": 0,
+                "inFlight": 0,
+                "maxWorkers": 2,
+                "maxInFlight": 1,
+            },
+        )
@@ -2,20 +2,37 @@ import os
 import time
 from unittest.mock import patch
 
+import jwt
 from cryptography.fernet import Fernet, InvalidToken
 
 from app.auth import PROFILE_TYPE_COMMERCIAL, PROFILE_TYPE_PRIVATE, FlaskServerTestCase
 from app.crypto import encrypt
+from app.decosjoin_service import user_keys_cache, workflow_date_cache
 from app.fixtures.data import get_document_blob
 from app.fixtures.response_mock import (
+    MockedResponse,
     get_response_mock,
+    get_response_mock_async,
+    mocked_get_urls,
     post_response_mock,
+    post_response_mock_async,
     post_response_mock_unauthorized,
 )
 from app.server import app
 
 TESTKEY = "z4QXWk3bjwFST2HRRVidnn7Se8VFCaHscK39JfODzNs="
 
+DOCUMENT_CONTENT_WITH_HEADERS = {
+    "http://localhost/decosweb/aspx/api/v1/items/DOCUMENTKEY02/content": (
+        get_document_blob(),
+        {
+            "Content-Type": "application/pdf",
+            "Content-Length": str(len(get_document_blob())),
+            "Content-Disposition": 'attachment; filename="document.pdf"',
+        },
+    )
+}
+
 
 @patch.dict(
     os.environ,
@@ -40,6 +57,11 @@ TESTKEY = "z4QXWk3bjwFST2HRRVidnn7Se8VFCaHscK39JfODzNs="
 class ApiTests(FlaskServerTestCase):
     app = app
 
+    def setUp(self):
+        super().setUp()
+        user_keys_cache.clear()
+        workflow_date_cache.clear()
+
     def expected_zaak(self):
         return {
             "caseType": "TVM - RVV - Object",
@@ -92,6 +114,24 @@ class ApiTests(FlaskServerTestCase):
 
         self.assertEqual(data["content"][1], self.expected_zaak())
 
+    @patch("app.server.DECOS_ASYNC_ENABLED", True)
+    @patch("app.helpers.AsyncDecosJoinConnection.get_response", get_response_mock_async)
+    @patch(
+        "app.helpers.AsyncDecosJoinConnection.post_response", post_response_mock_async
+    )
+    @patch("app.decosjoin_service.PAGE_SIZE", 10)
+    def test_getvergunningen_async(self):
+        response = self.client_get("/decosjoin/getvergunningen")
+
+        self.assertEqual(response.status_code, 200, response.data)
+        data = response.get_json()
+
+        self.assertEqual(len(data["content"]), 17)
+
+        del data["content"][1]["documentsUrl"]
+
+        self.assertEqual(data["content"][1], self.expected_zaak())
+
     @patch("app.helpers.DecosJoinConnection.get_response", get_response_mock)
     @patch(
         "app.helpers.DecosJoinConnection.post_response",
@@ -167,6 +207,124 @@ class ApiTests(FlaskServerTestCase):
         self.assertEqual(response.data, get_document_blob())
         self.assertEqual(response.headers["Content-Type"], "application/pdf")
 
+    @patch("app.helpers.DecosJoinConnection.get_response", get_response_mock)
+    @patch.dict(mocked_get_urls, DOCUMENT_CONTENT_WITH_HEADERS)
+    def test_get_document_blob_headers(self):
+        response = self.client_get(
+            f"/decosjoin/document/{encrypt('DOCUMENTKEY02', self.TEST_BSN)}",
+        )
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.data, get_document_blob())
+        self.assertEqual(
+            response.headers["Content-Length"], str(len(get_document_blob()))
+        )
+        self.assertEqual(
+            response.headers["Content-Disposition"],
+            'attachment; filename="document.pdf"',
+        )
+
+    @patch("app.helpers.DecosJoinConnection.get_response", get_response_mock)
+    def test_get_document_blob_not_modified(self):
+        location = f"/decosjoin/document/{encrypt('DOCUMENTKEY01', self.TEST_BSN)}"
+
+        response = self.client_get(location)
+        etag = response.headers["ETag"]
+        self.assertTrue(etag)
+
+        with patch(
+            "app.helpers.DecosJoinConnection.get_response"
+        ) as get_response_mock_not_called:
+            response = self.get_secure(location, headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        get_response_mock_not_called.assert_not_called()
+
+    @patch("app.helpers.DecosJoinConnection.get_response", get_response_mock)
+    @patch.dict(mocked_get_urls, DOCUMENT_CONTENT_WITH_HEADERS)
+    def test_get_document_blob_range(self):
+        response = self.get_secure(
+            f"/decosjoin/document/{encrypt('DOCUMENTKEY02', self.TEST_BSN)}",
+            headers={"Range": "bytes=0-9"},
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, get_document_blob()[:10])
+        self.assertEqual(
+            response.headers["Content-Range"],
+            f"bytes 0-9/{len(get_document_blob())}",
+        )
+
+    def test_get_document_blob_range_upstream(self):
+        partial_response = MockedResponse(
+            status_code=206,
+            _content=get_document_blob()[:10],
+            headers={
+                "Content-Type": "application/pdf",
+                "Content-Length": "10",
+                "Content-Range": f"bytes 0-9/{len(get_document_blob())}",
+            },
+        )
+
+        with patch(
+            "app.helpers.DecosJoinConnection.get_response",
+            return_value=partial_response,
+        ) as get_response:
+            response = self.get_secure(
+                f"/decosjoin/document/{encrypt('DOCUMENTKEY01', self.TEST_BSN)}",
+                headers={"Range": "bytes=0-9"},
+            )
+
+        self.assertEqual(get_response.call_args.kwargs["headers"]["Range"], "bytes=0-9")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, get_document_blob()[:10])
+        self.assertEqual(
+            response.headers["Content-Range"],
+            f"bytes 0-9/{len(get_document_blob())}",
+        )
+
+    def get_document_upstream_closed(self, method, headers=None):
+        """Requests a document of 100 bytes, returns the response and whether the upstream
+        response was closed."""
+        upstream_response = MockedResponse(
+            _content=b"x" * 100,
+            headers={"Content-Type": "application/pdf", "Content-Length": "100"},
+        )
+        location = f"/decosjoin/document/{encrypt('DOCUMENTKEY01', self.TEST_BSN)}"
+
+        with patch.object(upstream_response, "close") as close, patch(
+            "app.helpers.DecosJoinConnection.get_response",
+            return_value=upstream_response,
+        ), patch.object(jwt.PyJWKClient, "fetch_data") as fetch_data_mock:
+            fetch_data_mock.return_value = self.rsa_public_key_test
+            response = self.client.open(
+                location,
+                method=method,
+                headers=self.add_authorization_headers(
+                    PROFILE_TYPE_PRIVATE, headers=headers
+                ),
+            )
+            response.close()
+
+            return response, close.called
+
+    def test_get_document_blob_closes_upstream(self):
+        response, closed = self.get_document_upstream_closed("GET")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(closed)
+
+    def test_get_document_blob_head_closes_upstream(self):
+        response, closed = self.get_document_upstream_closed("HEAD")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b"")
+        self.assertTrue(closed)
+
+    def test_get_document_blob_range_not_satisfiable_closes_upstream(self):
+        response, closed = self.get_document_upstream_closed(
+            "GET", headers={"Range": "bytes=500-600"}
+        )
+        self.assertEqual(response.status_code, 416)
+        self.assertTrue(closed)
+
     @patch("app.helpers.DecosJoinConnection.get_response", get_response_mock)
     def test_get_document_unencrypted(self):
         response = self.client_get("/decosjoin/document/DOCUMENTKEY01")
@@ -0,0 +1,56 @@
+import json
+from datetime import date
+from unittest import TestCase
+
+from app.config import UpdatedJSONProvider
+from app.server import app
+from app.zaak_record import ZaakRecord
+from app.zaaktypes import RVVHeleStad
+
+Record = ZaakRecord.with_fields("Record", ("id", "title", "dateRequest"))
+
+
+class ZaakRecordTests(TestCase):
+    def test_mapping(self):
+        record = Record({"id": "Z1", "title": "Zaak"})
+        record["location"] = "Amstel 1"
+
+        self.assertEqual(record["id"], "Z1")
+        self.assertEqual(record.get("dateRequest"), None)
+        self.assertEqual(record.get("other", "default"), "default")
+        self.assertIn("location", record)
+        self.assertNotIn("dateRequest", record)
+        self.assertEqual(record.keys(), ["id", "title", "location"])
+        self.assertEqual(len(record), 3)
+
+        with self.assertRaises(KeyError):
+            record["dateRequest"]
+
+        self.assertEqual(record.pop("title"), "Zaak")
+        self.assertEqual(record.pop("location"), "Amstel 1")
+        self.assertEqual(record.pop("title", None), None)
+        self.assertEqual(record, {"id": "Z1"})
+
+    def test_slots(self):
+        record = Record({"id": "Z1"})
+
+        self.assertFalse(hasattr(record, "__dict__"))
+        self.assertIsNone(record._extra)
+
+    def test_field_names_do_not_shadow_methods(self):
+        ItemsRecord = ZaakRecord.with_fields("ItemsRecord", ("items", "get"))
+        record = ItemsRecord({"items": [1], "get": 2})
+
+        self.assertEqual(record.to_dict(), {"items": [1], "get": 2})
+
+    def test_json(self):
+        record = Record({"id": "Z1", "dateRequest": date(2021, 1, 2)})
+
+        self.assertEqual(
+            json.loads(UpdatedJSONProvider(app).dumps({"content": [record]})),
+            {"content": [{"id": "Z1", "dateRequest": "2021-01-02"}]},
+        )
+
+    def test_zaak_type_record(self):
+        self.assertIn("licensePlates", RVVHeleStad.record_class.fields)
+        self.assertEqual(RVVHeleStad.record_class.fields[0], "id")
@@ -1,8 +1,8 @@
 from datetime import date
 from unittest.case import TestCase
-from unittest.mock import MagicMock, call
+from unittest.mock import MagicMock
 
-from app.field_parsers import to_date
+from app.field_parsers import compile_parse_fields, to_date
 from app.zaaktypes import (
     BZB,
     BZP,
@@ -24,10 +24,27 @@ from app.zaaktypes import (
     TouringcarJaarontheffing,
     TouringcarDagontheffing,
     WerkEnVervoerOpStraat,
+    ZAAK_SOURCE_FIELDS,
+    get_select_fields,
+    zaken_index,
 )
 
 
 class ZaaktypesTest(TestCase):
+    def test_to_kenteken(self):
+        self.assertIsNone(BZP.to_kenteken(None))
+        self.assertIsNone(BZP.to_kenteken(""))
+        self.assertEqual(BZP.to_kenteken("kn-uw-ts"), "KN-UW-TS")
+        self.assertEqual(
+            BZP.to_kenteken("  KN-UW-TS, aazz88 ;; 12 -AB  "),
+            "KN-UW-TS | AAZZ88 | 12AB",
+        )
+        self.assertEqual(BZP.to_kenteken("AB - 12 | CD"), "AB | 12 | CD")
+
+    def test_parse_plan(self):
+        for Zaak in zaken_index.values():
+            self.assertEqual(Zaak.parse_plan, compile_parse_fields(Zaak.parse_fields))
+
     def test_next_april_first(self):
         self.assertEqual(
             VakantieVerhuurVergunning.next_april_first(date(2021, 3, 1)),
@@ -555,21 +572,27 @@ class ZaaktypesTest(TestCase):
         )
 
         class connection_mock:
-            get_workflow_date_by_step_title = MagicMock(
-                return_value=to_date("2023-04-11")
+            get_workflow_dates_by_step_titles = MagicMock(
+                return_value={
+                    RVVSloterweg.date_workflow_active_step_title: to_date("2023-04-11"),
+                    RVVSloterweg.date_workflow_verleend_step_title: to_date(
+                        "2023-04-12"
+                    ),
+                }
             )
 
         RVVSloterweg.defer_transform(zaak_transformed, connection_mock())
 
         self.assertEqual(zaak_transformed["dateWorkflowActive"], to_date("2023-04-11"))
         self.assertEqual(
-            zaak_transformed["dateWorkflowVerleend"], to_date("2023-04-11")
+            zaak_transformed["dateWorkflowVerleend"], to_date("2023-04-12")
         )
 
-        connection_mock.get_workflow_date_by_step_title.assert_has_calls(
+        connection_mock.get_workflow_dates_by_step_titles.assert_called_once_with(
+            "zaak-147",
             [
-                call("zaak-147", RVVSloterweg.date_workflow_active_step_title),
-                call("zaak-147", RVVSloterweg.date_workflow_verleend_step_title),
+                RVVSloterweg.date_workflow_active_step_title,
+                RVVSloterweg.date_workflow_verleend_step_title,
             ],
         )
 
@@ -803,3 +826,17 @@ class ZaaktypesTest(TestCase):
 
         WerkEnVervoerOpStraat.defer_transform(zaak_transformed, connection_mock())
         self.assertEqual(zaak_transformed["dateWorkflowActive"], to_date("2023-12-12"))
+
+    def test_get_select_fields(self):
+        select_fields = get_select_fields([BZP, RVVHeleStad])
+
+        self.assertEqual(
+            select_fields[: len(ZAAK_SOURCE_FIELDS)], list(ZAAK_SOURCE_FIELDS)
+        )
+        self.assertEqual(len(select_fields), len(set(select_fields)))
+
+        for zaak_type in [BZP, RVVHeleStad]:
+            for field in zaak_type.parse_fields:
+                self.assertIn(field["from"], select_fields)
+
+        self.assertNotIn("bol52", select_fields)
@@ -0,0 +1,133 @@
+_MISSING = object()
+
+
+class ZaakRecord:
+    """Compact zaak. The values of the fields of a zaak type are stored in slots, the field names
+    are stored once in the schema of the zaak type, other keys go into an overflow dict.
+
+    Behaves like (and compares equal to) the dict of the zaak, see UpdatedJSONProvider for the
+    serialization."""
+
+    __slots__ = ("_extra",)
+
+    fields = ()
+    slot_names = {}
+
+    def __init__(self, values: dict = None):
+        self._extra = None
+
+        if values:
+            self.update(values)
+
+    @classmethod
+    def with_fields(cls, name: str, fields):
+        """Returns a ZaakRecord class with a slot for each of the fields"""
+        fields = tuple(dict.fromkeys(fields))
+        # Slots are prefixed so a field can't shadow the methods of the record
+        slot_names = {field: f"_{field}" for field in fields}
+
+        return type(
+            name,
+            (cls,),
+            {
+                "__slots__": tuple(slot_names.values()),
+                "fields": fields,
+                "slot_names": slot_names,
+            },
+        )
+
+    def get(self, key, default=None):
+        slot_name = self.slot_names.get(key)
+
+        if slot_name is not None:
+            return getattr(self, slot_name, default)
+
+        if self._extra is None:
+            return default
+
+        return self._extra.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+
+        if value is _MISSING:
+            raise KeyError(key)
+
+        return value
+
+    def __setitem__(self, key, value):
+        slot_name = self.slot_names.get(key)
+
+        if slot_name is not None:
+            setattr(self, slot_name, value)
+        elif self._extra is None:
+            self._extra = {key: value}
+        else:
+            self._extra[key] = value
+
+    def pop(self, key, default=_MISSING):
+        value = self.get(key, _MISSING)
+
+        if value is _MISSING:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+
+        if key in self.slot_names:
+            delattr(self, self.slot_names[key])
+        else:
+            del self._extra[key]
+
+        return value
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def update(self, values: dict):
+        for key, value in values.items():
+            self[key] = value
+
+    def keys(self):
+        return [key for key, _ in self.items()]
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def items(self):
+        items = []
+
+        for key, slot_name in self.slot_names.items():
+            value = getattr(self, slot_name, _MISSING)
+            if value is not _MISSING:
+                items.append((key, value))
+
+        if self._extra:
+            items.extend(self._extra.items())
+
+        return items
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.items())
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, ZaakRecord):
+            other = other.to_dict()
+
+        if not isinstance(other, dict):
+            return NotImplemented
+
+        return self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
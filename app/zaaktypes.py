@@ -1,9 +1,12 @@
 import re
 from datetime import date
+from functools import lru_cache
 
 from app.config import IS_PRODUCTION
 from app.field_parsers import (
-    get_fields,
+    compile_parse_fields,
+    compile_translations,
+    get_compiled_fields,
     get_translation,
     to_date,
     to_int,
@@ -13,15 +16,51 @@ from app.field_parsers import (
     to_bool,
     to_bool_if_exists,
 )
+from app.zaak_record import ZaakRecord
 
 
 def static(method):
     return method.__func__
 
 
+KENTEKEN_SEPARATORS = re.compile("[^0-9a-zA-Z-]+")
+KENTEKEN_SPACES = re.compile(" +")
+
+# Fields of the Decos source items read by every Zaak, besides the ones in its parse_fields
+ZAAK_SOURCE_FIELDS = (
+    "mark",
+    "text45",
+    "subject1",
+    "title",
+    "dfunction",
+    "date5",
+    "document_date",
+    "processed",
+    "text11",
+    "text12",
+)
+
+# Keys of every zaak, the documentsUrl is added when the zaken are sorted
+ZAAK_FIELDS = (
+    "id",
+    "caseType",
+    "title",
+    "identifier",
+    "dateRequest",
+    "dateWorkflowActive",
+    "status",
+    "decision",
+    "dateDecision",
+    "description",
+    "processed",
+    "documentsUrl",
+)
+
+
 class Zaak:
     enabled = True
     zaak_source = None
+    zaak_id = None
 
     zaak_type = None
     title = None
@@ -30,33 +69,56 @@ class Zaak:
     status_translations = []
     decision_translations = []
     parse_fields = []
+    parse_plan = ()
+    status_translation_index = {}
+    decision_translation_index = {}
+    record_class = ZaakRecord
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # The parse_fields and translations are compiled once, when the Zaak type is defined
+        cls.parse_plan = compile_parse_fields(cls.parse_fields)
+        cls.status_translation_index = compile_translations(cls.status_translations)
+        cls.decision_translation_index = compile_translations(cls.decision_translations)
+        cls.record_class = ZaakRecord.with_fields(
+            f"{cls.__name__}Record",
+            ZAAK_FIELDS + tuple(name for name, _, _ in cls.parse_plan),
+        )
 
-    def __init__(self, zaak_source: dict):
+    def __init__(self, zaak_source: dict, zaak_id: str = None):
+        """zaak_source are the fields of the Decos item, zaak_id defaults to its "id" field"""
         self.zaak_source = zaak_source
+        self.zaak_id = zaak_source.get("id") if zaak_id is None else zaak_id
 
-        if not self.has_valid_source_data():
-            return
-        self.transform()
-        self.after_transform()
+        if self.has_valid_source_data():
+            self.transform()
+            self.after_transform()
+
+        # The source is not needed anymore once the zaak is built
+        self.zaak_source = None
 
     def transform(self):
+        date_request = self.to_date_request()
+
         # Data that's present in every Zaak
-        self.zaak = {
-            "id": self.zaak_source["id"],
-            "caseType": self.zaak_type,
-            "title": self.to_title(),
-            "identifier": self.to_identifier(),
-            "dateRequest": self.to_date_request(),
-            "dateWorkflowActive": self.to_date_request(),
-            "status": self.to_status(),
-            "decision": self.to_decision(),
-            "dateDecision": self.to_date_decision(),
-            "description": self.to_description(),
-            "processed": self.to_processed(),
-        }
+        self.zaak = self.record_class(
+            {
+                "id": self.zaak_id,
+                "caseType": self.zaak_type,
+                "title": self.to_title(),
+                "identifier": self.to_identifier(),
+                "dateRequest": date_request,
+                "dateWorkflowActive": date_request,
+                "status": self.to_status(),
+                "decision": self.to_decision(),
+                "dateDecision": self.to_date_decision(),
+                "description": self.to_description(),
+                "processed": self.to_processed(),
+            }
+        )
 
         # Arbitrary data for individual Zaken
-        self.zaak.update(get_fields(self.parse_fields, self.zaak_source))
+        self.zaak.update(get_compiled_fields(self.parse_plan, self.zaak_source))
 
     def after_transform(self):
         """Post transformation"""
@@ -66,6 +128,15 @@ class Zaak:
     # def defer_transform(self, zaak_deferred, decosjoin_service):
     #     return zaak_deferred
 
+    @classmethod
+    def get_workflow_step_titles(cls) -> list:
+        """The titles of the workflow steps (date_workflow_*_step_title) used in defer_transform"""
+        return [
+            getattr(cls, name)
+            for name in dir(cls)
+            if name.startswith("date_workflow_") and name.endswith("_step_title")
+        ]
+
     def to_title(self):
         """Returns the title we want to give to the particular case"""
         return self.title
@@ -78,11 +149,11 @@ class Zaak:
 
     def to_status(self) -> str:
         status_source = to_string_if_exists(self.zaak_source, "title")
-        return get_translation(status_source, self.status_translations, True)
+        return get_translation(status_source, self.status_translation_index, True)
 
     def to_decision(self) -> str:  # Resultaat (besluit)
         decision_source = to_string_if_exists(self.zaak_source, "dfunction")
-        return get_translation(decision_source, self.decision_translations, True)
+        return get_translation(decision_source, self.decision_translation_index, True)
 
     def to_date_decision(self) -> str:  # Datum afhandeling
         return to_date(to_string_if_exists(self.zaak_source, "date5"))
@@ -455,14 +526,15 @@ class BZP(Zaak):
     title = "Parkeerontheffingen Blauwe zone particulieren"
 
     @staticmethod
+    @lru_cache(maxsize=4096)  # The same plates occur in many zaken of a user
     def to_kenteken(value) -> bool:
         if not value:
             return None
 
-        value = re.sub("[^0-9a-zA-Z-]+", " ", value)
-        value = re.sub(" +", " ", value.strip())
-        value = re.sub(" -", "", value.upper())
-        value = re.sub(" ", " | ", value.upper())
+        value = KENTEKEN_SEPARATORS.sub(" ", value)
+        value = KENTEKEN_SPACES.sub(" ", value.strip())
+        value = value.upper().replace(" -", "")
+        value = value.replace(" ", " | ")
 
         return value
 
@@ -607,7 +679,7 @@ class ZwaarVerkeer(Zaak):
     def to_kind(kind_source) -> str:
         if not kind_source:
             return None
-        return get_translation(kind_source, ZwaarVerkeer.kind_translations, True)
+        return get_translation(kind_source, ZwaarVerkeer.kind_translation_index, True)
 
     parse_fields = [
         {
@@ -666,6 +738,7 @@ class ZwaarVerkeer(Zaak):
         ["Dagontheffing", "Dagontheffing hele zone"],
         ["Jaarontheffing", "Jaarontheffing hele zone"],
     ]
+    kind_translation_index = compile_translations(kind_translations)
 
     decision_translations = [
         ["Ingetrokken", "Ingetrokken"],
@@ -913,14 +986,20 @@ class RVVSloterweg(Zaak):
 
     @staticmethod
     def defer_transform(zaak_deferred, decosjoin_service):
-        date_workflow_active = decosjoin_service.get_workflow_date_by_step_title(
-            zaak_deferred["id"], RVVSloterweg.date_workflow_active_step_title
+        workflow_dates = decosjoin_service.get_workflow_dates_by_step_titles(
+            zaak_deferred["id"],
+            [
+                RVVSloterweg.date_workflow_active_step_title,
+                RVVSloterweg.date_workflow_verleend_step_title,
+            ],
         )
-        zaak_deferred["dateWorkflowActive"] = date_workflow_active
+        zaak_deferred["dateWorkflowActive"] = workflow_dates[
+            RVVSloterweg.date_workflow_active_step_title
+        ]
 
-        date_workflow_verleend = decosjoin_service.get_workflow_date_by_step_title(
-            zaak_deferred["id"], RVVSloterweg.date_workflow_verleend_step_title
-        )
+        date_workflow_verleend = workflow_dates[
+            RVVSloterweg.date_workflow_verleend_step_title
+        ]
         zaak_deferred["dateWorkflowVerleend"] = date_workflow_verleend
 
         if date_workflow_verleend is not None:
@@ -1455,3 +1534,15 @@ class WerkEnVervoerOpStraat(Zaak):
 zaken_index = {
     getattr(cls, "zaak_type"): cls for cls in Zaak.__subclasses__() if cls.enabled
 }
+
+
+def get_select_fields(zaak_types) -> list:
+    """Returns the fields of the Decos source items that are read by the zaak_types"""
+    fields = dict.fromkeys(ZAAK_SOURCE_FIELDS)
+
+    for zaak_type in zaak_types:
+        fields.update(
+            dict.fromkeys(source_key for _, source_key, _ in zaak_type.parse_plan)
+        )
+
+    return list(fields)